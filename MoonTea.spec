@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('icon.ico', '.'), ( 'background.jpg', '.')],  # Включить файл иконки
-    hiddenimports=[],
+    hiddenimports=['cryptography.hazmat.primitives.asymmetric.ed25519'],  # Проверка подписи обновлений
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,24 +1,1693 @@
+import time  # Замер времени запуска и скорости загрузки.
+STARTUP_STARTED = time.perf_counter()
+
 import tkinter as tk  # Библиотека для создания GUI.
 from tkinter import messagebox, filedialog  # Всплывающие окна и диалоговые окна для выбора файлов.
 from tkinter import ttk  # Модернизированные виджеты Tkinter.
 import os  # Работа с файловой системой.
 import shutil  # Операции с файлами и каталогами.
+import stat  # Объекты хранилища доступны только для чтения.
 import subprocess  # Запуск внешних процессов.
-import requests  # HTTP-запросы.
 import json  # Работа с JSON-файлами.
 import uuid  # Генерация уникальных идентификаторов.
 import logging  # Логирование событий.
+import logging.handlers  # Журналы игры с ротацией.
 import platform  # Определение операционной системы.
-import minecraft_launcher_lib as mll  # Библиотека для работы с Minecraft Launcher.
-from PIL import Image, ImageTk  # Работа с изображениями.
-import zipfile # Работа с zip-файлами
+import hashlib  # Контрольные суммы файлов сборки.
+import zlib  # CRC32 для сравнения файлов с содержимым архивов.
+import threading  # Фоновые задачи и синхронизация потоков загрузки.
+import queue  # Очередь событий от фоновых задач к интерфейсу.
+import sys  # Аргументы командной строки.
+import contextlib  # Блокировка каталога сборки на время загрузки и установки.
+from concurrent.futures import ThreadPoolExecutor, as_completed  # Пул потоков загрузки.
+from urllib.parse import urlsplit  # Разбор адресов для лимитов по хостам.
+# requests, minecraft_launcher_lib, zipfile и PIL импортируются внутри функций при первом использовании,
+# чтобы не задерживать появление окна
 
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Версия лаунчера, сравнивается с версией на сервере при проверке обновлений
+LAUNCHER_VERSION = "1.0.0"
+UPDATE_TIMEOUT = (3, 10)
+# Открытый ключ Ed25519 (base64), которым подписываются обновления лаунчера. Ответ /api/launcher/version
+# с подписью строки "<версия>\n<sha256 exe>" в поле signature готовит release.py
+UPDATE_PUBLIC_KEY = "JZfaga4/RIuJ9oYbeiQvor113aiU7f8VCJD1hcdrwUg="
+
+# Адрес API сервера сборок и каталог локального кэша
+API_URL = "http://178.173.82.2:1010"
+CACHE_DIR = "cache"
+REQUEST_TIMEOUT = (5, 30)
+BUILDS_TIMEOUT = (3, 5)
+BUILDS_CACHE = os.path.join(CACHE_DIR, "builds.json")
+HTTP_POOL_SIZE = 32
+
+# Кэш команды запуска: шаблон с подстановками для никнейма, UUID и аргументов JVM
+COMMAND_CACHE_NAME = ".launch_command.json"
+USERNAME_PLACEHOLDER = "__moontea_username__"
+UUID_PLACEHOLDER = "__moontea_uuid__"
+JVM_ARGS_PLACEHOLDER = "__moontea_jvm_args__"
+
+# Автоматический профиль JVM: размер кучи по числу модов и памяти компьютера, параметры сборщика мусора по числу ядер
+JVM_BASE_HEAP_MB = 2048
+JVM_HEAP_PER_MOD_MB = 24
+JVM_MAX_HEAP_MB = 12288
+JVM_MIN_HEAP_MB = 1024
+JVM_SYSTEM_RESERVE_MB = 2048
+JVM_PRETOUCH_MARGIN_MB = 2048
+JVM_MAX_GC_THREADS = 8
+
+# Наблюдение за процессом игры: журналы с ротацией и замеры памяти и CPU
+GAME_LOG_DIR = "logs"
+GAME_LOG_MAX_BYTES = 5 * 1024 * 1024
+GAME_LOG_BACKUPS = 5
+GAME_LOG_QUEUE_SIZE = 10000
+TELEMETRY_INTERVAL = 5
+TELEMETRY_HISTORY = 20
+OOM_MARKERS = ("java.lang.OutOfMemoryError", "Could not reserve enough space", "Insufficient memory")
+
+# Фон масштабируется один раз и хранится в кэше в формате PPM, который Tk читает без Pillow
+BACKGROUND_SOURCE = "background.jpg"
+BACKGROUND_SIZE = (600, 400)
+
+# Бюджет времени до первого кадра окна (мс)
+STARTUP_BUDGET_MS = 500
+# Результат --startup-time: собранный exe работает без консоли, поэтому замер сохраняется в файл
+STARTUP_REPORT = os.path.join(GAME_LOG_DIR, "startup_time.json")
+
+# Локальный манифест сборки: размер, mtime и хэш каждого загруженного файла
+MANIFEST_NAME = ".manifest.json"
+CHUNK_SIZE = 1024 * 1024
+
+# Ограничения распаковки архивов: защита от zip-бомб
+MAX_EXTRACT_SIZE = 4 * 1024 ** 3
+MAX_COMPRESSION_RATIO = 200
+
+# Общее хранилище объектов по хэшу содержимого, разделяемое всеми сборками
+STORE_DIR = os.path.join("store", "objects")
+RUNTIME_DIRS = ["libraries", "assets", "versions"]
+# Каталоги, которые установщик Forge только дополняет: их файлы хранятся один раз и связываются ссылками.
+# Остальное (versions, индексы ассетов) маленькое и остаётся собственной копией сборки
+SHARED_RUNTIME_DIRS = ["libraries", os.path.join("assets", "objects")]
+
+# Параметры параллельной загрузки
+DOWNLOAD_WORKERS = 8
+PER_HOST_LIMIT = 6
+PROGRESS_INTERVAL = 0.1
+DOWNLOAD_RETRIES = 3
+
+# Фоновая подготовка выбранной сборки: меньше потоков, ограничение скорости (байт/с),
+# срок, в течение которого подготовленная сборка запускается без повторной проверки (с)
+WARM_WORKERS = 2
+WARM_BANDWIDTH = 4 * 1024 * 1024
+WARM_MAX_AGE = 600
+
+# Настройки лаунчера: тип и значение по умолчанию каждого поля, задержка пакетной записи на диск (с)
+SETTINGS_PATH = "settings.json"
+SETTINGS_SAVE_DELAY = 1.0
+SETTINGS_FIELDS = {
+    "ram": (int, 4000),
+    "jvm_auto": (bool, True),
+    "jvm": (dict, {}),
+    "dev_mode": (bool, False),
+    "theme": (str, "light"),
+    "close_launcher": (bool, False),
+    "nickname": (str, ""),
+    "selected_build": (str, ""),
+    "download_workers": (int, DOWNLOAD_WORKERS),
+    "installed": (dict, {}),
+}
+
+# Интервал опроса очереди событий фоновых задач (мс)
+EVENT_POLL_MS = 100
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(build_path):
+    manifest_path = os.path.join(build_path, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(build_path, manifest):
+    manifest_path = os.path.join(build_path, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_artifact_verified(path, entry, remote_size, remote_hash):
+    # Артефакт установлен, только если он был проверен при загрузке и с тех пор не менялся
+    if not entry:
+        return False
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if entry.get("size") != st.st_size or entry.get("mtime") != st.st_mtime_ns:
+        return False
+    if remote_size is not None and remote_size != st.st_size:
+        return False
+    return not remote_hash or entry.get("hash") == remote_hash
+
+
+def manifest_entry(path, file_hash):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": file_hash}
+
+
+def is_file_current(path, entry, remote_size, remote_hash):
+    # Без размера и хэша с сервера сравнивать не с чем — файл нужно скачать заново
+    if remote_size is None and remote_hash is None:
+        return False
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if remote_size is not None and st.st_size != remote_size:
+        return False
+    if not remote_hash:
+        return True
+    # Если размер и mtime совпадают с манифестом, хэш берём из него без чтения файла
+    if entry and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+        local_hash = entry.get("hash")
+    else:
+        local_hash = file_sha256(path)
+    return local_hash == remote_hash
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # Фоновая задача: выполняется в отдельном потоке и сообщает о ходе работы через очередь событий,
+    # которую опрашивает главный поток Tk
+    def __init__(self, target, events=None, limiter=None):
+        self.target = target
+        self.events = events
+        self.limiter = limiter
+        self.result = None
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def post(self, kind, **data):
+        if self.events is not None:
+            self.events.put((self, kind, data))
+
+    def _run(self):
+        try:
+            result = self.result = self.target(self)
+        except JobCancelled:
+            logging.info("Задача отменена")
+            self.post("cancelled")
+        except Exception as e:
+            logging.exception(f"Ошибка в фоновой задаче: {e}")
+            self.post("error", error=e)
+        else:
+            self.post("done", result=result)
+
+
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def build_lock(build_name):
+    with _build_locks_guard:
+        return _build_locks.setdefault(build_name, threading.Lock())
+
+
+@contextlib.contextmanager
+def hold_build_lock(build_name, job):
+    # Каталог сборки меняет только одна задача: фоновая подготовка или запуск. Ожидание прерывается отменой
+    lock = build_lock(build_name)
+    while not lock.acquire(timeout=0.2):
+        job.check_cancelled()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def store_object_path(file_hash):
+    return os.path.join(STORE_DIR, file_hash[:2], file_hash)
+
+
+def remove_file(path):
+    # В Windows файл только для чтения нельзя удалить или заменить, пока не снят атрибут
+    try:
+        os.remove(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(path)
+
+
+def replace_file(source, destination):
+    try:
+        os.replace(source, destination)
+    except PermissionError:
+        os.chmod(destination, stat.S_IREAD | stat.S_IWRITE)
+        os.replace(source, destination)
+
+
+def protect_object(object_path):
+    # Объект разделяется жёсткими ссылками между сборками: запись через любую из них испортит все
+    os.chmod(object_path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+
+
+def link_file(source, destination):
+    # Жёсткая ссылка, если файловая система её поддерживает, иначе копия; замена атомарная
+    tmp_path = destination + ".link"
+    if os.path.exists(tmp_path):
+        remove_file(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    replace_file(tmp_path, destination)
+
+
+def verified_object(file_hash, expected_size=None):
+    # Путь к объекту хранилища, если его содержимое совпадает с хэшем. Испорченный объект удаляется,
+    # чтобы файл был загружен заново
+    object_path = store_object_path(file_hash)
+    try:
+        size = os.path.getsize(object_path)
+    except OSError:
+        return None
+    if (expected_size is None or size == expected_size) and file_sha256(object_path) == file_hash:
+        return object_path
+    logging.warning(f"Объект хранилища {file_hash} повреждён и будет удалён")
+    remove_file(object_path)
+    return None
+
+
+def add_to_store(path, file_hash):
+    # Кладёт проверенный файл в хранилище; если такой объект уже есть, файл заменяется ссылкой на него
+    object_path = verified_object(file_hash)
+    if object_path is not None:
+        if not os.path.samefile(object_path, path):
+            link_file(object_path, path)
+        protect_object(object_path)
+        return
+    object_path = store_object_path(file_hash)
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    link_file(path, object_path)
+    protect_object(object_path)
+
+
+def link_from_store(file_hash, destination, expected_size=None):
+    object_path = verified_object(file_hash, expected_size)
+    if object_path is None:
+        return False
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    link_file(object_path, destination)
+    protect_object(object_path)
+    return True
+
+
+def break_links(mc_directory):
+    # Сборки, установленные до перехода на копии, могут ссылаться на объекты хранилища из каталогов Forge.
+    # Перед установкой Forge такие ссылки заменяются собственными копиями
+    broken = 0
+    for runtime_dir in RUNTIME_DIRS:
+        for root, _, names in os.walk(os.path.join(mc_directory, runtime_dir)):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.stat(path).st_nlink < 2:
+                    continue
+                tmp_path = path + ".link"
+                st = os.stat(path)
+                shutil.copyfile(path, tmp_path)
+                # mtime сохраняется, чтобы после установки неизменённые файлы не хэшировались заново
+                os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                replace_file(tmp_path, path)
+                broken += 1
+    if broken:
+        logging.info(f"Заменено ссылок на хранилище собственными копиями: {broken}")
+    return broken
+
+
+def referenced_hashes():
+    # Хэши объектов, на которые ссылается манифест хотя бы одной сборки
+    hashes = set()
+    if not os.path.isdir("builds"):
+        return hashes
+    for build_name in os.listdir("builds"):
+        build_path = os.path.join("builds", build_name)
+        if not os.path.isfile(os.path.join(build_path, MANIFEST_NAME)):
+            continue
+        manifest = load_manifest(build_path)
+        entries = list(manifest["files"].values())
+        entries += list(manifest.get("artifacts", {}).values())
+        entries += list(manifest.get("runtime", {}).get("files", {}).values())
+        hashes.update(entry["hash"] for entry in entries if entry.get("hash"))
+    return hashes
+
+
+def collect_garbage():
+    # Удаляет из хранилища объекты, на которые не ссылается ни одна сборка
+    if not os.path.isdir(STORE_DIR):
+        return 0, 0
+    # Пока сборка загружается, новые объекты уже в хранилище, но ещё не записаны в её манифест
+    with _build_locks_guard:
+        locks = list(_build_locks.values())
+    held = []
+    try:
+        for lock in locks:
+            if not lock.acquire(blocking=False):
+                logging.info("Сборка ещё загружается, очистка хранилища отложена")
+                return 0, 0
+            held.append(lock)
+        return remove_unreferenced()
+    finally:
+        for lock in held:
+            lock.release()
+
+
+def remove_unreferenced():
+    referenced = referenced_hashes()
+    removed = 0
+    freed = 0
+    for prefix in os.listdir(STORE_DIR):
+        prefix_path = os.path.join(STORE_DIR, prefix)
+        for name in os.listdir(prefix_path):
+            if name in referenced:
+                continue
+            object_path = os.path.join(prefix_path, name)
+            freed += os.path.getsize(object_path)
+            remove_file(object_path)
+            removed += 1
+        if not os.listdir(prefix_path):
+            os.rmdir(prefix_path)
+    if removed:
+        logging.info(f"Удалено неиспользуемых объектов из хранилища: {removed}, освобождено {freed / 1048576:.1f} МБ")
+    return removed, freed
+
+
+def seed_runtime(mc_directory, forge_version):
+    # Переносит в сборку библиотеки и ассеты другой сборки с той же версией Forge, чтобы установщик не скачивал их заново.
+    # Ассеты никто не перезаписывает, поэтому они связываются ссылками. Библиотеки копируются: процессоры установщика
+    # Forge могут перезаписывать их на месте. После установки ingest_runtime снова заменит копии ссылками
+    if not os.path.isdir("builds"):
+        return 0
+    seeded = 0
+    for build_name in os.listdir("builds"):
+        build_path = os.path.join("builds", build_name)
+        if os.path.abspath(build_path) == os.path.abspath(mc_directory):
+            continue
+        if not os.path.isfile(os.path.join(build_path, MANIFEST_NAME)):
+            continue
+        runtime = load_manifest(build_path).get("runtime", {})
+        if runtime.get("forge_version") != forge_version:
+            continue
+        for rel_path, entry in runtime.get("files", {}).items():
+            destination = os.path.join(mc_directory, *rel_path.split("/"))
+            if os.path.exists(destination):
+                continue
+            if rel_path.startswith("assets/objects/"):
+                if link_from_store(entry["hash"], destination, entry.get("size")):
+                    seeded += 1
+                continue
+            object_path = verified_object(entry["hash"], entry.get("size"))
+            if object_path is None:
+                continue
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copyfile(object_path, destination)
+            seeded += 1
+        logging.info(f"Из сборки {build_name} перенесено файлов Forge: {seeded}")
+        break
+    return seeded
+
+
+def ingest_runtime(mc_directory, job, previous=None):
+    # После установки Forge переносит библиотеки и ассеты в общее хранилище и заменяет их ссылками.
+    # Установщик пишет в эти файлы только во время установки, а перед ней break_links возвращает сборке
+    # собственные копии. Файлы, не изменившиеся с прошлой установки, не хэшируются заново
+    previous = previous or {}
+    files = {}
+    for runtime_dir in SHARED_RUNTIME_DIRS:
+        for root, _, names in os.walk(os.path.join(mc_directory, runtime_dir)):
+            for name in names:
+                if name.endswith((".part", ".link")):
+                    continue
+                job.check_cancelled()
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, mc_directory).replace(os.sep, "/")
+                st = os.stat(path)
+                entry = previous.get(rel_path)
+                if entry and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+                    file_hash = entry["hash"]
+                else:
+                    file_hash = file_sha256(path)
+                object_path = store_object_path(file_hash)
+                if not (os.path.exists(object_path) and os.path.samefile(object_path, path)):
+                    add_to_store(path, file_hash)
+                files[rel_path] = manifest_entry(path, file_hash)
+    return files
+
+
+def file_crc32(path):
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def safe_extract_path(root, member_name):
+    # Запрещаем выход за пределы каталога сборки через ../ и абсолютные пути
+    target = os.path.realpath(os.path.join(root, member_name))
+    if os.path.commonpath([root, target]) != root:
+        raise ValueError(f"Недопустимый путь в архиве: {member_name}")
+    return target
+
+
+def is_member_current(path, info, entry):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if st.st_size != info.file_size:
+        return False
+    # Файл не менялся с прошлой распаковки — CRC берём из записи, не читая его
+    if entry and entry.get("crc") == info.CRC and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+        return True
+    return file_crc32(path) == info.CRC
+
+
+def extract_archive(zip_path, build_path, archive_hash, record, job):
+    # Распаковывает только изменившиеся файлы архива; неизменённый архив пропускается целиком
+    import zipfile
+
+    if record and archive_hash and record.get("hash") == archive_hash:
+        logging.debug(f"Архив {os.path.basename(zip_path)} не изменился, распаковка пропущена")
+        return record
+
+    root = os.path.realpath(build_path)
+    entries = (record or {}).get("entries", {})
+    new_entries = {}
+    written = 0
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        members = zip_ref.infolist()
+        if sum(info.file_size for info in members) > MAX_EXTRACT_SIZE:
+            raise ValueError("Распакованный размер архива превышает допустимый")
+        for info in members:
+            job.check_cancelled()
+            target = safe_extract_path(root, info.filename)
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if info.compress_size and info.file_size > CHUNK_SIZE and info.file_size / info.compress_size > MAX_COMPRESSION_RATIO:
+                raise ValueError(f"Подозрительная степень сжатия у {info.filename}")
+
+            entry = entries.get(info.filename)
+            if not is_member_current(target, info, entry):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = target + ".part"
+                size = 0
+                try:
+                    with zip_ref.open(info) as source, open(tmp_path, "wb") as f:
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                            size += len(chunk)
+                            if size > info.file_size:
+                                raise ValueError(f"Размер {info.filename} больше заявленного в архиве")
+                            f.write(chunk)
+                    os.replace(tmp_path, target)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                written += 1
+            st = os.stat(target)
+            new_entries[info.filename] = {"crc": info.CRC, "size": st.st_size, "mtime": st.st_mtime_ns}
+
+    logging.info(f"Архив {os.path.basename(zip_path)}: записано файлов {written} из {len(new_entries)}")
+    return {"hash": archive_hash, "entries": new_entries}
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_session():
+    # Общая HTTP-сессия с пулом соединений для всех запросов лаунчера
+    global _session
+    import requests
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def api_cache_path(api_path):
+    return os.path.join(CACHE_DIR, "api", hashlib.sha1(api_path.encode("utf-8")).hexdigest() + ".json")
+
+
+def write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Имя временного файла уникально для потока: кэш может записываться из нескольких задач сразу
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_json(api_path, offline=False):
+    # GET с кэшем на диске: при неизменном ETag сервер отвечает 304 и данные берутся из кэша.
+    # Без связи с сервером (или в режиме offline) используются сохранённые данные
+    import requests
+
+    cache_path = api_cache_path(api_path)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cached = None
+
+    if offline:
+        if cached is None:
+            raise requests.ConnectionError(f"Нет сохранённых данных для {api_path}")
+        logging.debug(f"Режим без сети, используется кэш {api_path}")
+        return cached["data"]
+
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    try:
+        response = http_session().get(API_URL + api_path, headers=headers, timeout=REQUEST_TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        if cached is None:
+            raise
+        logging.warning(f"Сервер недоступен ({e}), используется кэш {api_path}")
+        return cached["data"]
+    if response.status_code == 304 and cached:
+        logging.debug(f"{api_path} не изменился (304), используется кэш")
+        return cached["data"]
+    response.raise_for_status()
+    data = response.json()
+    write_json_atomic(cache_path, {"path": api_path, "etag": response.headers.get("ETag"), "data": data})
+    return data
+
+
+def load_cached_builds():
+    # Список сборок с прошлого запуска: окно показывается сразу, без ожидания сервера
+    try:
+        with open(BUILDS_CACHE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"timestamp": None, "builds": []}
+    cached.setdefault("timestamp", None)
+    cached.setdefault("builds", [])
+    return cached
+
+
+def fetch_builds(timeout=REQUEST_TIMEOUT):
+    logging.debug("Загрузка доступных сборок с сервера")
+    response = http_session().get(f"{API_URL}/api/builds", timeout=timeout)
+    response.raise_for_status()
+    builds = response.json()
+    logging.info(f"Сборки успешно загружены: {builds}")
+    write_json_atomic(BUILDS_CACHE, {"timestamp": time.time(), "builds": builds})
+    return builds
+
+
+def resolve_build(build_name, offline=False):
+    # Единственный запрос метаданных сборки и версии за запуск
+    logging.debug(f"Получение информации о сборке {build_name}")
+    build_info = fetch_json(f"/api/build/{build_name}", offline)
+    logging.debug(f"Информация о сборке получена: {build_info}")
+    version_name = build_info["version"]
+
+    logging.debug("Получение информации о версиях Minecraft")
+    versions = fetch_json("/api/versions", offline)
+    if version_name not in versions:
+        raise ValueError(f"Версия {version_name} не найдена среди доступных версий")
+    return {
+        "build": build_info,
+        "version_name": version_name,
+        "version": versions[version_name],
+    }
+
+
+class TokenBucket:
+    # Ограничение скорости загрузки, общее для всех потоков; rate=None снимает ограничение
+    def __init__(self, rate):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.tokens = 0
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.tokens = rate or 0
+
+    def consume(self, count, cancel_event=None):
+        with self.lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            # Запас не больше секунды трафика; долг гасится ожиданием
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - count
+            self.updated = now
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay and cancel_event is not None:
+            cancel_event.wait(delay)
+        elif delay:
+            time.sleep(delay)
+
+
+class DownloadProgress:
+    # Суммарный прогресс загрузки, обновляется из рабочих потоков
+    def __init__(self, total_files=0, total_bytes=0):
+        self.lock = threading.Lock()
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.done_files = 0
+        self.done_bytes = 0
+        self.started = time.monotonic()
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.done_bytes += count
+
+    def add_file(self):
+        with self.lock:
+            self.done_files += 1
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            return {
+                "done_files": self.done_files,
+                "total_files": self.total_files,
+                "done_bytes": self.done_bytes,
+                "total_bytes": self.total_bytes,
+                "elapsed": elapsed,
+                "bytes_per_sec": self.done_bytes / elapsed,
+                "files_per_sec": self.done_files / elapsed,
+            }
+
+
+class Downloader:
+    # Пул потоков с общей HTTP-сессией и ограничением одновременных соединений на хост
+    def __init__(self, workers=DOWNLOAD_WORKERS, per_host=PER_HOST_LIMIT, progress_callback=None, cancel_event=None,
+                 limiter=None):
+        self.workers = max(1, workers)
+        self.limiter = limiter
+        self.per_host = max(1, per_host)
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event or threading.Event()
+        self.session = http_session()
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+        self._abort = threading.Event()
+        self._last_report = 0.0
+        self.progress = DownloadProgress()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _report(self, force=False):
+        if not self.progress_callback:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        self.progress_callback(self.progress.snapshot())
+
+    def _check_cancelled(self):
+        if self.cancel_event.is_set() or self._abort.is_set():
+            raise JobCancelled()
+
+    def _fetch_part(self, url, tmp_path, count_existing):
+        # Докачивает .part с места остановки через Range; без поддержки Range сервер вернёт 200 и файл начнётся заново
+        import requests
+
+        digest = hashlib.sha256()
+        offset = os.path.getsize(tmp_path) if os.path.exists(tmp_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.session.get(url, stream=True, timeout=REQUEST_TIMEOUT, headers=headers) as r:
+            if r.status_code == 416:
+                os.remove(tmp_path)
+                return self._fetch_part(url, tmp_path, count_existing)
+            r.raise_for_status()
+            if offset and r.status_code == 206:
+                mode = "ab"
+                with open(tmp_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                if count_existing:
+                    self.progress.add_bytes(offset)
+                logging.debug(f"Докачка {os.path.basename(tmp_path)} с позиции {offset}")
+            else:
+                mode = "wb"
+                offset = 0
+
+            expected_total = None
+            if r.status_code == 206 and "/" in r.headers.get("Content-Range", ""):
+                total = r.headers["Content-Range"].rsplit("/", 1)[1]
+                expected_total = int(total) if total.isdigit() else None
+            elif "Content-Length" in r.headers and "Content-Encoding" not in r.headers:
+                expected_total = int(r.headers["Content-Length"])
+
+            with open(tmp_path, mode) as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    self._check_cancelled()
+                    f.write(chunk)
+                    digest.update(chunk)
+                    self.progress.add_bytes(len(chunk))
+                    self._report()
+                    if self.limiter is not None:
+                        self.limiter.consume(len(chunk), self.cancel_event)
+
+        size = os.path.getsize(tmp_path)
+        if expected_total is not None and size != expected_total:
+            raise requests.ConnectionError(f"Соединение оборвалось: получено {size} из {expected_total} байт")
+        return digest, size
+
+    def fetch(self, url, path, expected_hash=None, expected_size=None):
+        # Загружает файл во временный .part и переименовывает его после проверки размера и хэша
+        import requests
+
+        tmp_path = path + ".part"
+        self._check_cancelled()
+        with self._host_semaphore(url):
+            attempt = 0
+            while True:
+                try:
+                    digest, size = self._fetch_part(url, tmp_path, count_existing=attempt == 0)
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    # При обрыве .part сохраняется, и следующая попытка (или следующий запуск) продолжит загрузку
+                    attempt += 1
+                    if attempt > DOWNLOAD_RETRIES:
+                        raise
+                    logging.warning(f"Обрыв загрузки {os.path.basename(path)}: {e}, попытка {attempt}/{DOWNLOAD_RETRIES}")
+                except JobCancelled:
+                    # Недокачанный файл удаляется только при отмене пользователем. Если загрузку остановила
+                    # ошибка другого файла, .part остаётся для докачки при следующем запуске
+                    if self.cancel_event.is_set() and os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                except BaseException:
+                    # При ошибке сервера недокачанный файл не оставляем
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        file_hash = digest.hexdigest()
+        if (expected_hash and file_hash != expected_hash) or (expected_size is not None and size != expected_size):
+            os.remove(tmp_path)
+            raise requests.RequestException(f"Контрольная сумма файла {os.path.basename(path)} не совпадает")
+        replace_file(tmp_path, path)
+        self.progress.add_file()
+        self._report(force=True)
+        return file_hash
+
+    def download_all(self, tasks, on_done=None):
+        # tasks — список словарей с ключами url, path, size, hash; on_done(task, file_hash) вызывается в текущем потоке
+        self.progress = DownloadProgress(len(tasks), sum(task.get("size") or 0 for task in tasks))
+        if not tasks:
+            return
+        self._abort.clear()
+        self._report(force=True)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {
+                executor.submit(self.fetch, task["url"], task["path"], task.get("hash"), task.get("size")): task
+                for task in tasks
+            }
+            for future in as_completed(futures):
+                task = futures[future]
+                file_hash = future.result()
+                if on_done:
+                    on_done(task, file_hash)
+        except BaseException:
+            # Останавливаем остальные загрузки, чтобы не ждать их завершения
+            self._abort.set()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        stats = self.progress.snapshot()
+        logging.info(
+            f"Загружено файлов: {stats['done_files']}, {stats['done_bytes'] / 1048576:.1f} МБ "
+            f"за {stats['elapsed']:.1f} с ({stats['bytes_per_sec'] / 1048576:.1f} МБ/с, "
+            f"{stats['files_per_sec']:.1f} файлов/с)"
+        )
+
+
+def download_build(build_name, build_info, job, workers=DOWNLOAD_WORKERS):
+    import requests
+    import zipfile
+
+    logging.debug(f"Загрузка сборки: {build_name}")
+    build_path = os.path.join("builds", build_name)
+    os.makedirs(build_path, exist_ok=True)
+    manifest = load_manifest(build_path)
+    remote_files = set()
+    tasks = []
+    archives = []
+
+    downloader = Downloader(
+        workers,
+        progress_callback=lambda snapshot: job.post("progress", **snapshot),
+        cancel_event=job.cancel_event,
+        limiter=job.limiter,
+    )
+    try:
+        for folder in ["mods", "shaderpacks", "resourcepacks", "other"]:
+            folder_path = os.path.join(build_path, folder)
+            os.makedirs(folder_path, exist_ok=True)
+
+            logging.info(f"Проверка файлов сборки {build_name} в папке {folder}")
+            for file_info in build_info.get(folder, []):
+                if "name" in file_info:
+                    file_name = file_info["name"]
+                    file_path = os.path.join(folder_path, file_name)
+                    rel_path = f"{folder}/{file_name}"
+                    remote_files.add(rel_path)
+                    remote_size = file_info.get("size")
+                    remote_hash = file_info.get("hash")
+
+                    entry = manifest["files"].get(rel_path)
+                    if is_file_current(file_path, entry, remote_size, remote_hash):
+                        if entry is None or entry.get("mtime") != os.stat(file_path).st_mtime_ns:
+                            file_hash = remote_hash or file_sha256(file_path)
+                            add_to_store(file_path, file_hash)
+                            manifest["files"][rel_path] = manifest_entry(file_path, file_hash)
+                        logging.debug(f"Файл {file_name} не изменился, загрузка пропущена")
+                    elif remote_hash and link_from_store(remote_hash, file_path, remote_size):
+                        manifest["files"][rel_path] = manifest_entry(file_path, remote_hash)
+                        logging.debug(f"Файл {file_name} взят из общего хранилища")
+                    else:
+                        tasks.append({
+                            "url": f"{API_URL}/api/build/download/{build_name}/{folder}/{file_name}",
+                            "path": file_path,
+                            "rel_path": rel_path,
+                            "size": remote_size,
+                            "hash": remote_hash,
+                        })
+
+                    # ZIP-архивы из папки other разархивируются после загрузки
+                    if folder == "other" and file_name.endswith(".zip"):
+                        archives.append(file_path)
+                else:
+                    logging.error(f"Отсутствует поле 'name' в информации о файле: {file_info}")
+
+        def on_done(task, file_hash):
+            add_to_store(task["path"], file_hash)
+            manifest["files"][task["rel_path"]] = manifest_entry(task["path"], file_hash)
+            logging.info(f"Файл {os.path.basename(task['path'])} успешно загружен")
+
+        logging.info(f"Файлов к загрузке для сборки {build_name}: {len(tasks)}")
+        job.post("status", text=f"Загрузка файлов сборки: {len(tasks)}")
+        try:
+            downloader.download_all(tasks, on_done)
+        except requests.RequestException as e:
+            logging.error(f"Ошибка при загрузке файлов для сборки {build_name}: {e}")
+            raise RuntimeError(f"Failed to download files for {build_name}: {e}") from e
+
+        # Проверяем ZIP-архивы и разархивируем их
+        archive_records = manifest.setdefault("archives", {})
+        for file_path in archives:
+            job.check_cancelled()
+            file_name = os.path.basename(file_path)
+            rel_path = f"other/{file_name}"
+            entry = manifest["files"].get(rel_path)
+            logging.info(f"Разархивирование файла {file_name} в директорию {build_path}")
+            try:
+                archive_records[rel_path] = extract_archive(
+                    file_path, build_path, entry and entry.get("hash"), archive_records.get(rel_path), job
+                )
+            except zipfile.BadZipFile:
+                logging.error(f"Файл {file_name} повреждён или не является ZIP-архивом")
+            except ValueError as e:
+                logging.error(f"Архив {file_name} отклонён: {e}")
+
+        # Удаляем файлы, которых больше нет в списке сборки на сервере
+        for rel_path in list(manifest["files"]):
+            if rel_path not in remote_files:
+                stale_path = os.path.join(build_path, *rel_path.split("/"))
+                if os.path.exists(stale_path):
+                    remove_file(stale_path)
+                    logging.info(f"Удалён устаревший файл {rel_path}")
+                del manifest["files"][rel_path]
+                manifest.get("archives", {}).pop(rel_path, None)
+    finally:
+        save_manifest(build_path, manifest)
+
+
+def forge_callback(job):
+    # Колбэки minecraft_launcher_lib: передают ход установки в интерфейс и прерывают её при отмене
+    state = {"max": 0}
+
+    def set_status(text):
+        job.check_cancelled()
+        job.post("status", text=text)
+
+    def set_progress(value):
+        job.check_cancelled()
+        job.post("install_progress", value=value, maximum=state["max"])
+
+    def set_max(value):
+        state["max"] = value
+
+    return {"setStatus": set_status, "setProgress": set_progress, "setMax": set_max}
+
+
+class SettingsStore:
+    # Настройки читаются с диска один раз и дальше живут в памяти. Изменения собираются в одну запись
+    # с задержкой SETTINGS_SAVE_DELAY, файл заменяется атомарно: временный файл, fsync, переименование
+    def __init__(self, path=SETTINGS_PATH, save_delay=SETTINGS_SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.lock = threading.RLock()
+        self.timer = None
+        self.values = {}
+        self.load()
+
+    def load(self):
+        logging.debug(f"Загрузка настроек из {self.path}")
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            logging.info("Настройки загружены успешно")
+        except FileNotFoundError:
+            logging.warning("Файл настроек не найден, загрузка настроек по умолчанию")
+            data = {}
+        except json.JSONDecodeError as e:
+            logging.error(f"Файл настроек повреждён ({e}), загрузка настроек по умолчанию")
+            data = {}
+        for key, value in data.items():
+            if key in SETTINGS_FIELDS:
+                try:
+                    self.values[key] = self.coerce(key, value)
+                except (TypeError, ValueError):
+                    logging.warning(f"Некорректное значение настройки {key}: {value!r}, используется значение по умолчанию")
+            elif key != "builds":
+                self.values[key] = value
+        # Память, заданная до появления автоматического профиля JVM, остаётся в силе
+        if "ram" in data and "jvm_auto" not in data:
+            self.values["jvm_auto"] = False
+        # Прежний формат: список установленных сборок без версий
+        installed = self.values.setdefault("installed", {})
+        for build in data.get("builds", []):
+            installed.setdefault(build, {"version": None, "hash": None})
+
+    def coerce(self, key, value):
+        field_type = SETTINGS_FIELDS[key][0]
+        if field_type is int:
+            return int(float(value))
+        if not isinstance(value, field_type):
+            raise TypeError(f"ожидается {field_type.__name__}")
+        return value
+
+    def get(self, key):
+        with self.lock:
+            if key in self.values:
+                return self.values[key]
+            default = SETTINGS_FIELDS[key][1]
+            return default.copy() if isinstance(default, dict) else default
+
+    def update(self, **changes):
+        with self.lock:
+            for key, value in changes.items():
+                self.values[key] = self.coerce(key, value) if key in SETTINGS_FIELDS else value
+            self.schedule_save()
+
+    def is_installed(self, build, version):
+        # Сборка, записанная в прежнем формате, считается установленной для любой версии
+        with self.lock:
+            entry = self.values["installed"].get(build)
+            return entry is not None and entry["version"] in (None, version)
+
+    def mark_installed(self, build, version, version_hash):
+        with self.lock:
+            self.values["installed"][build] = {"version": version, "hash": version_hash}
+        # Установка дорогая, поэтому её результат записывается сразу
+        self.flush()
+
+    def schedule_save(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.save_delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            data = json.dumps(self.values, indent=4, ensure_ascii=False)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        logging.info("Настройки сохранены")
+
+
+def install_build(build, metadata, job, settings):
+    import minecraft_launcher_lib as mll
+    import requests
+
+    build_info = metadata["build"]
+    version_name = metadata["version_name"]
+    mc_directory = os.path.join("builds", build_info["name"])
+    version_details = metadata["version"]
+    forge_version = version_details["forge_version"]
+    name_version = version_details["name"]
+
+    version_path = os.path.join(mc_directory, "versions", version_name)
+    jar_path = os.path.join(version_path, f"{forge_version}.jar")
+    artifact_key = f"versions/{version_name}/{forge_version}.jar"
+    logging.debug(f"Путь до версии: {version_path}")
+    manifest = load_manifest(mc_directory)
+    artifacts = manifest.setdefault("artifacts", {})
+    remote_size = version_details.get("size")
+    remote_hash = version_details.get("hash")
+    if is_artifact_verified(jar_path, artifacts.get(artifact_key), remote_size, remote_hash):
+        logging.debug(f"Версия {name_version} уже загружена и проверена")
+    elif remote_hash and link_from_store(remote_hash, jar_path, remote_size):
+        artifacts[artifact_key] = manifest_entry(jar_path, remote_hash)
+        save_manifest(mc_directory, manifest)
+        logging.debug(f"Версия {name_version} взята из общего хранилища")
+    else:
+        os.makedirs(version_path, exist_ok=True)
+        logging.debug(f"Загрузка версии Minecraft {name_version}")
+        job.post("status", text=f"Загрузка версии {name_version}")
+        downloader = Downloader(
+            1,
+            progress_callback=lambda snapshot: job.post("progress", **snapshot),
+            cancel_event=job.cancel_event,
+            limiter=job.limiter,
+        )
+
+        def on_done(task, file_hash):
+            add_to_store(jar_path, file_hash)
+            artifacts[artifact_key] = manifest_entry(jar_path, file_hash)
+            save_manifest(mc_directory, manifest)
+
+        try:
+            downloader.download_all([{
+                "url": f"{API_URL}/api/version/download/{version_name}",
+                "path": jar_path,
+                "size": remote_size,
+                "hash": remote_hash,
+            }], on_done)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Ошибка при загрузке версии Minecraft {forge_version}: {e}")
+            raise RuntimeError(f"Failed to download Minecraft version {name_version}: {e}") from e
+        except OSError as e:
+            logging.error(f"Ошибка при сохранении версии Minecraft {forge_version}: {e}")
+            raise RuntimeError(f"Failed to save Minecraft version {name_version}: {e}") from e
+
+    if settings.is_installed(build, forge_version):
+        logging.debug("Сборка уже установлена")
+    else:
+        logging.debug("Сборка ещё не установлена")
+        logging.debug(f"Установка версии Forge: {forge_version} в {mc_directory}")
+        job.post("status", text=f"Установка Forge {forge_version}")
+        break_links(mc_directory)
+        seed_runtime(mc_directory, forge_version)
+        mll.forge.install_forge_version(forge_version, mc_directory, callback=forge_callback(job))
+
+        job.post("status", text="Перенос библиотек в общее хранилище")
+        previous_runtime = manifest.get("runtime", {}).get("files")
+        manifest["runtime"] = {"forge_version": forge_version, "files": ingest_runtime(mc_directory, job, previous_runtime)}
+        save_manifest(mc_directory, manifest)
+
+        # Сборка считается установленной только после успешной установки Forge
+        settings.mark_installed(build, forge_version, artifacts.get(artifact_key, {}).get("hash"))
+
+
+def system_memory():
+    # Общая и свободная физическая память в МБ; (None, None), если определить не удалось
+    try:
+        import psutil
+        memory = psutil.virtual_memory()
+        return memory.total // 1048576, memory.available // 1048576
+    except ImportError:
+        pass
+    if platform.system() == "Windows":
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys // 1048576, status.ullAvailPhys // 1048576
+        return None, None
+    try:
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        return (
+            os.sysconf("SC_PHYS_PAGES") * page_size // 1048576,
+            os.sysconf("SC_AVPHYS_PAGES") * page_size // 1048576,
+        )
+    except (AttributeError, ValueError, OSError):
+        return None, None
+
+
+def count_mods(mc_directory):
+    mods_path = os.path.join(mc_directory, "mods")
+    if not os.path.isdir(mods_path):
+        return 0
+    return sum(1 for entry in os.scandir(mods_path) if entry.is_file() and entry.name.endswith(".jar"))
+
+
+def jvm_profile(mc_directory, metadata, settings):
+    # Параметры по умолчанию вычисляются автоматически, затем накладываются поле "jvm" метаданных сборки
+    # и пользовательские настройки: heap_mb, min_heap_mb, gc ("g1" или "zgc"), pretouch, gc_threads, extra_args
+    total_mb, free_mb = system_memory()
+    cores = os.cpu_count() or 2
+    mods = count_mods(mc_directory)
+
+    heap_mb = min(JVM_BASE_HEAP_MB + mods * JVM_HEAP_PER_MOD_MB, JVM_MAX_HEAP_MB)
+    if total_mb:
+        heap_mb = min(heap_mb, total_mb - JVM_SYSTEM_RESERVE_MB, total_mb * 3 // 4)
+    heap_mb = max(heap_mb // 256 * 256, JVM_MIN_HEAP_MB)
+    profile = {
+        "heap_mb": heap_mb,
+        "min_heap_mb": None,
+        "gc": "g1",
+        "pretouch": None,
+        "gc_threads": max(1, min(cores - 1, JVM_MAX_GC_THREADS)),
+        "extra_args": [],
+    }
+    build_overrides = metadata["build"].get("jvm")
+    if isinstance(build_overrides, dict):
+        profile.update({key: value for key, value in build_overrides.items() if key in profile})
+    if not settings.get("jvm_auto"):
+        # Память, заданная ползунком, важнее размера кучи из метаданных сборки
+        profile["heap_mb"] = settings.get("ram")
+        profile["min_heap_mb"] = None
+    user_overrides = settings.get("jvm")
+    if isinstance(user_overrides, dict):
+        profile.update({key: value for key, value in user_overrides.items() if key in profile})
+
+    heap_mb = int(profile["heap_mb"])
+    if profile["pretouch"] is None:
+        # Предварительное касание страниц кучи убирает подвисания при её росте, но только если память точно свободна
+        profile["pretouch"] = bool(free_mb and free_mb >= heap_mb + JVM_PRETOUCH_MARGIN_MB)
+    min_heap_mb = heap_mb if profile["pretouch"] else int(profile["min_heap_mb"] or heap_mb // 2)
+    gc_threads = int(profile["gc_threads"])
+    args = [f"-Xmx{heap_mb}M", f"-Xms{min(min_heap_mb, heap_mb)}M"]
+    if profile["gc"] == "zgc":
+        # ZGC доступен начиная с Java 15, поэтому включается только явно
+        args += ["-XX:+UnlockExperimentalVMOptions", "-XX:+UseZGC"]
+    else:
+        args += ["-XX:+UseG1GC", "-XX:+ParallelRefProcEnabled", "-XX:MaxGCPauseMillis=200", "-XX:+DisableExplicitGC"]
+    args += [f"-XX:ParallelGCThreads={gc_threads}", f"-XX:ConcGCThreads={max(1, gc_threads // 4)}"]
+    if profile["pretouch"]:
+        args.append("-XX:+AlwaysPreTouch")
+    args += list(profile["extra_args"])
+
+    logging.info(
+        f"Профиль JVM для {metadata['build']['name']}: модов {mods}, ядер {cores}, "
+        f"память {total_mb} МБ (свободно {free_mb} МБ) -> {' '.join(args)}"
+    )
+    return {"heap_mb": heap_mb, "args": args}
+
+
+def versions_fingerprint(mc_directory):
+    # Размер и mtime всех описаний версий: меняются при установке или обновлении версии
+    fingerprint = []
+    versions_path = os.path.join(mc_directory, "versions")
+    if not os.path.isdir(versions_path):
+        return fingerprint
+    for version_dir in sorted(os.scandir(versions_path), key=lambda entry: entry.name):
+        if not version_dir.is_dir():
+            continue
+        for entry in sorted(os.scandir(version_dir.path), key=lambda entry: entry.name):
+            if entry.name.endswith(".json"):
+                st = entry.stat()
+                fingerprint.append([f"{version_dir.name}/{entry.name}", st.st_size, st.st_mtime_ns])
+    return fingerprint
+
+
+def classpath_fingerprint(command):
+    # Хэш набора библиотек из -cp: путь, размер и mtime каждого файла, без разбора описаний версий
+    digest = hashlib.sha256()
+    if "-cp" in command:
+        for path in command[command.index("-cp") + 1].split(os.pathsep):
+            try:
+                st = os.stat(path)
+                digest.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+            except OSError:
+                digest.update(f"{path}|missing\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_command_template(mc_directory, key):
+    cache_path = os.path.join(mc_directory, COMMAND_CACHE_NAME)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if cached.get("key") != key or cached.get("versions") != versions_fingerprint(mc_directory):
+        return None
+    if cached.get("classpath") != classpath_fingerprint(cached["template"]):
+        return None
+    return cached["template"]
+
+
+def build_command_template(mc_directory, name_version, key):
+    import minecraft_launcher_lib as mll
+
+    # Команда строится с подстановочными значениями, которые заменяются при каждом запуске
+    options = {
+        "username": USERNAME_PLACEHOLDER,
+        "uuid": UUID_PLACEHOLDER,
+        "token": "0",
+        "jvmArguments": [JVM_ARGS_PLACEHOLDER]
+    }
+    template = mll.command.get_minecraft_command(name_version, mc_directory, options)
+    write_json_atomic(os.path.join(mc_directory, COMMAND_CACHE_NAME), {
+        "key": key,
+        "versions": versions_fingerprint(mc_directory),
+        "classpath": classpath_fingerprint(template),
+        "template": template,
+    })
+    return template
+
+
+def get_launch_command(nickname, metadata, jvm_args):
+    mc_directory = os.path.join("builds", metadata["build"]["name"])
+    name_version = metadata["version"]["name"]
+    key = {
+        "launcher": LAUNCHER_VERSION,
+        "build": metadata["build"]["name"],
+        "version": metadata["version_name"],
+        "name_version": name_version,
+    }
+    logging.debug(f"Получение команды запуска Minecraft для версии: {metadata['version_name']}")
+    template = load_command_template(mc_directory, key)
+    if template is None:
+        logging.debug("Кэш команды запуска отсутствует или устарел, команда строится заново")
+        template = build_command_template(mc_directory, name_version, key)
+
+    user_uuid = str(uuid.uuid4())
+    command = []
+    for arg in template:
+        if arg == JVM_ARGS_PLACEHOLDER:
+            command += jvm_args
+        else:
+            command.append(arg.replace(USERNAME_PLACEHOLDER, nickname).replace(UUID_PLACEHOLDER, user_uuid))
+    return command
+
+
+class GameProcess:
+    # Запускает игру и следит за ней: вывод пишется в журнал с ротацией, память и CPU процесса Java
+    # замеряются с заданным интервалом, о завершении, сбое или нехватке памяти сообщается интерфейсу
+    def __init__(self, command, build, events, xmx_mb, creationflags=0):
+        self.command = command
+        self.build = build
+        self.events = events
+        self.xmx_mb = xmx_mb
+        self.creationflags = creationflags
+        self.log_dir = os.path.join(GAME_LOG_DIR, build)
+        self.lines = queue.Queue(maxsize=GAME_LOG_QUEUE_SIZE)
+        self.dropped_lines = 0
+        self.oom = False
+        self.samples = []
+        self.process = None
+        self.started = None
+        self.finished = threading.Event()
+
+    def post(self, kind, **data):
+        if self.events is not None:
+            self.events.put((self, kind, data))
+
+    def start(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.logger = logging.getLogger(f"game.{self.build}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(self.log_dir, "game.log"),
+            maxBytes=GAME_LOG_MAX_BYTES,
+            backupCount=GAME_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+
+        self.started = time.time()
+        self.process = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            creationflags=self.creationflags,
+        )
+        logging.info(f"Игра запущена, PID {self.process.pid}, журнал: {self.log_dir}")
+        self.post("game_started", build=self.build)
+        self.log_writer = threading.Thread(target=self._write_log, daemon=True)
+        self.log_writer.start()
+        for target in (self._read_output, self._sample, self._wait):
+            threading.Thread(target=target, daemon=True).start()
+        return self
+
+    def _read_output(self):
+        # Чтение не ждёт записи на диск: при переполнении очереди строки отбрасываются, а игра не блокируется на выводе
+        for raw_line in iter(self.process.stdout.readline, b""):
+            line = raw_line.decode("utf-8", errors="replace").rstrip()
+            if not self.oom and any(marker in line for marker in OOM_MARKERS):
+                self.oom = True
+            try:
+                self.lines.put_nowait(line)
+            except queue.Full:
+                self.dropped_lines += 1
+        self.process.stdout.close()
+        self.lines.put(None)
+
+    def _write_log(self):
+        while True:
+            line = self.lines.get()
+            if line is None:
+                break
+            self.logger.info(line)
+        if self.dropped_lines:
+            self.logger.info(f"[лаунчер] пропущено строк вывода: {self.dropped_lines}")
+
+    def _sample(self):
+        try:
+            import psutil
+        except ImportError:
+            logging.info("psutil не установлен, замеры памяти и CPU игры отключены")
+            return
+        processes = {}
+        while not self.finished.wait(TELEMETRY_INTERVAL):
+            try:
+                root = psutil.Process(self.process.pid)
+                tree = [root] + root.children(recursive=True)
+            except psutil.Error:
+                continue
+            rss = 0
+            cpu = 0.0
+            for proc in tree:
+                # Объекты Process сохраняются между замерами, иначе cpu_percent всегда возвращает 0
+                proc = processes.setdefault(proc.pid, proc)
+                try:
+                    rss += proc.memory_info().rss
+                    cpu += proc.cpu_percent(None)
+                except psutil.Error:
+                    continue
+            sample = {"time": round(time.time() - self.started, 1), "rss_mb": round(rss / 1048576), "cpu": round(cpu, 1)}
+            self.samples.append(sample)
+            self.post("game_telemetry", **sample)
+
+    def _wait(self):
+        exit_code = self.process.wait()
+        self.finished.set()
+        self.log_writer.join()
+        duration = time.time() - self.started
+        crash_report = self._find_crash_report()
+        crashed = exit_code != 0 or crash_report is not None
+        summary = {
+            "build": self.build,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "duration": round(duration),
+            "exit_code": exit_code,
+            "crashed": crashed,
+            "oom": self.oom,
+            "crash_report": crash_report,
+            "log": os.path.join(self.log_dir, "game.log"),
+            "xmx_mb": self.xmx_mb,
+            "peak_rss_mb": max((sample["rss_mb"] for sample in self.samples), default=None),
+            "avg_cpu": round(sum(sample["cpu"] for sample in self.samples) / len(self.samples), 1) if self.samples else None,
+            "dropped_log_lines": self.dropped_lines,
+        }
+        self._save_telemetry(summary)
+        if crashed:
+            logging.error(f"Игра завершилась с ошибкой: {summary}")
+        else:
+            logging.info(f"Игра завершена: {summary}")
+        self.post("game_exited", **summary)
+
+    def _find_crash_report(self):
+        crash_dir = os.path.join("builds", self.build, "crash-reports")
+        if not os.path.isdir(crash_dir):
+            return None
+        reports = [entry for entry in os.scandir(crash_dir) if entry.is_file() and entry.stat().st_mtime >= self.started]
+        if not reports:
+            return None
+        return max(reports, key=lambda entry: entry.stat().st_mtime).path
+
+    def _save_telemetry(self, summary):
+        telemetry_path = os.path.join(self.log_dir, "telemetry.json")
+        try:
+            with open(telemetry_path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            history = []
+        history = (history + [dict(summary, samples=self.samples)])[-TELEMETRY_HISTORY:]
+        write_json_atomic(telemetry_path, history)
+
+
+def load_background(master):
+    st = os.stat(BACKGROUND_SOURCE)
+    width, height = BACKGROUND_SIZE
+    cache_name = f"background_{width}x{height}_{st.st_size}_{st.st_mtime_ns}.ppm"
+    cache_path = os.path.join(CACHE_DIR, cache_name)
+    if not os.path.exists(cache_path):
+        from PIL import Image
+
+        logging.debug(f"Масштабирование фона в {cache_path}")
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with Image.open(BACKGROUND_SOURCE) as image:
+            scaled = image.convert("RGB").resize(BACKGROUND_SIZE, Image.LANCZOS)
+        tmp_path = cache_path + ".tmp"
+        scaled.save(tmp_path, "PPM")
+        os.replace(tmp_path, cache_path)
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith("background_") and name != cache_name:
+                os.remove(os.path.join(CACHE_DIR, name))
+    return tk.PhotoImage(master=master, file=cache_path)
+
+
+def parse_version(version):
+    return tuple(int(part) if part.isdigit() else 0 for part in str(version).split("."))
+
+
+def launcher_path():
+    # Обновлять можно только собранный exe-файл, а не запуск из исходников
+    if getattr(sys, "frozen", False):
+        return sys.executable
+    return None
+
+
+def swap_launcher(exe_path, new_path):
+    # Windows позволяет переименовать запущенный exe, поэтому новая версия встаёт на место сразу,
+    # а начнёт работать при следующем запуске
+    old_path = exe_path + ".old"
+    if os.path.exists(old_path):
+        os.remove(old_path)
+    os.replace(exe_path, old_path)
+    try:
+        os.replace(new_path, exe_path)
+    except OSError:
+        os.replace(old_path, exe_path)
+        raise
+
+
+def plan_delta(exe_path, info):
+    # Сопоставляет блоки новой версии с текущим exe: блок ищется на том же смещении, на смещении с учётом
+    # изменения размера (данные после изменённого места) и среди всех выровненных блоков текущего файла
+    block_size = info["block_size"]
+    remote_size = info["size"]
+    local_size = os.path.getsize(exe_path)
+    shift = local_size - remote_size
+    plan = []
+    with open(exe_path, "rb") as local:
+        index = {}
+        offset = 0
+        for chunk in iter(lambda: local.read(block_size), b""):
+            index.setdefault(hashlib.sha256(chunk).hexdigest(), offset)
+            offset += len(chunk)
+
+        for number, block_hash in enumerate(info["blocks"]):
+            start = number * block_size
+            length = min(block_size, remote_size - start)
+            source = None
+            for candidate in (start, start + shift):
+                if 0 <= candidate and candidate + length <= local_size:
+                    local.seek(candidate)
+                    if hashlib.sha256(local.read(length)).hexdigest() == block_hash:
+                        source = candidate
+                        break
+            if source is None and length == block_size:
+                source = index.get(block_hash)
+
+            # Соседние блоки объединяются в один отрезок: копирование или один Range-запрос
+            kind = "remote" if source is None else "local"
+            if plan and plan[-1][0] == kind and (kind == "remote" or plan[-1][1] + plan[-1][2] == source):
+                plan[-1][2] += length
+            else:
+                plan.append([kind, start if source is None else source, length])
+    return plan
+
+
+def apply_delta(exe_path, info, new_path, job):
+    import requests
+
+    plan = plan_delta(exe_path, info)
+    url = f"{API_URL}/api/launcher/download/exe"
+    tmp_path = new_path + ".part"
+    downloaded = 0
+    try:
+        with open(exe_path, "rb") as local, open(tmp_path, "wb") as out:
+            for kind, start, length in plan:
+                job.check_cancelled()
+                if kind == "local":
+                    local.seek(start)
+                    out.write(local.read(length))
+                    continue
+                headers = {"Range": f"bytes={start}-{start + length - 1}"}
+                with http_session().get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise requests.RequestException("Сервер не поддерживает загрузку частей файла")
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        out.write(chunk)
+                        downloaded += len(chunk)
+        if os.path.getsize(tmp_path) != info["size"] or file_sha256(tmp_path) != info["hash"]:
+            raise requests.RequestException("Контрольная сумма обновления не совпадает")
+        os.replace(tmp_path, new_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logging.info(f"Обновление собрано из текущей версии, загружено {downloaded / 1024:.0f} КБ из {info['size'] / 1024:.0f} КБ")
+
+
+def verify_update_signature(info):
+    # Подпись проверяется встроенным ключом, а не хэшем с того же сервера: сервер доступен по HTTP,
+    # и подменивший ответ мог бы подменить и exe, и его хэш
+    if not UPDATE_PUBLIC_KEY:
+        logging.warning("Ключ подписи обновлений не задан, автообновление отключено")
+        return False
+    if not info.get("signature") or not info.get("hash"):
+        logging.error("Сервер не передал подпись обновления, обновление отклонено")
+        return False
+    try:
+        import base64
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    except ImportError:
+        logging.warning("Пакет cryptography не установлен, подпись обновления проверить нельзя")
+        return False
+    try:
+        public_key = Ed25519PublicKey.from_public_bytes(base64.b64decode(UPDATE_PUBLIC_KEY))
+        public_key.verify(base64.b64decode(info["signature"]), f"{info['version']}\n{info['hash']}".encode("utf-8"))
+    except (InvalidSignature, ValueError) as e:
+        logging.error(f"Подпись обновления {info['version']} недействительна, обновление отклонено: {e!r}")
+        return False
+    return True
+
+
+def check_for_update(job):
+    exe_path = launcher_path()
+    if exe_path is None:
+        logging.debug("Лаунчер запущен не из exe, проверка обновлений пропущена")
+        return None
+    old_path = exe_path + ".old"
+    if os.path.exists(old_path):
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+    response = http_session().get(f"{API_URL}/api/launcher/version", timeout=UPDATE_TIMEOUT)
+    response.raise_for_status()
+    info = response.json()
+    if parse_version(info["version"]) <= parse_version(LAUNCHER_VERSION):
+        logging.debug(f"Установлена актуальная версия лаунчера {LAUNCHER_VERSION}")
+        return None
+
+    logging.info(f"Доступна новая версия лаунчера: {info['version']}")
+    if not verify_update_signature(info):
+        return None
+    new_path = exe_path + ".new"
+    if not (os.path.exists(new_path) and file_sha256(new_path) == info.get("hash")):
+        if info.get("blocks") and info.get("block_size") and info.get("hash"):
+            apply_delta(exe_path, info, new_path, job)
+        else:
+            Downloader(1, cancel_event=job.cancel_event).download_all([{
+                "url": f"{API_URL}/api/launcher/download/exe",
+                "path": new_path,
+                "size": info.get("size"),
+                "hash": info.get("hash"),
+            }])
+    # Подписан хэш, поэтому заменяется только файл, совпадающий с ним
+    if file_sha256(new_path) != info["hash"]:
+        os.remove(new_path)
+        raise ValueError(f"Обновление {info['version']} не совпадает с подписанным хэшем")
+    swap_launcher(exe_path, new_path)
+    return info["version"]
+
+
 class MinecraftLauncher(tk.Tk):
-    def __init__(self):
+    def __init__(self, measure_startup=False):
         super().__init__()
+        self.measure_startup = measure_startup
+        self.startup_ms = None
         logging.debug("Инициализация лаунчера")
         self.title("MoonTea Launcher")
         self.geometry("600x400")
@@ -29,26 +1698,64 @@ class MinecraftLauncher(tk.Tk):
         self.iconbitmap("icon.ico")
 
         # Загрузка настроек
-        self.settings = self.load_settings()
+        self.settings = SettingsStore()
 
         # Применение темы оформления
-        self.theme = self.settings.get("theme", "light")
+        self.theme = self.settings.get("theme")
         self.apply_theme()
 
         # Загрузка фонового изображения
-        self.background_image = Image.open("background.jpg")
-        self.background_photo = ImageTk.PhotoImage(self.background_image.resize((600, 400), Image.LANCZOS))
+        self.background_photo = load_background(self)
         self.background_label = tk.Label(self, image=self.background_photo)
         self.background_label.place(relwidth=1, relheight=1)
 
         # Инициализация переменных
         self.skin_path = ""
-        self.builds = self.load_builds()
-        self.nickname = self.settings.get("nickname", "")
-        self.selected_build = self.settings.get("selected_build", "")
+        cached_builds = load_cached_builds()
+        self.builds = cached_builds["builds"]
+        self.builds_timestamp = cached_builds["timestamp"]
+        self.server_online = None
+        self.nickname = self.settings.get("nickname")
+        self.selected_build = self.settings.get("selected_build")
+
+        # Фоновые задачи сообщают о ходе работы через очередь событий
+        self.job = None
+        # Фоновая подготовка выбранной сборки и результат последней завершённой подготовки
+        self.warm_job = None
+        self.warm_state = None
+        self.handoff_job = None
+        self.running_build = None
+        self.events = queue.Queue()
 
         # Создание виджетов интерфейса
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(EVENT_POLL_MS, self.poll_events)
+        self.after_idle(self.on_first_frame)
+
+    def on_first_frame(self):
+        self.update_idletasks()
+        self.startup_ms = (time.perf_counter() - STARTUP_STARTED) * 1000
+        logging.info(f"Время до первого кадра: {self.startup_ms:.0f} мс")
+        if self.startup_ms > STARTUP_BUDGET_MS:
+            logging.warning(f"Время до первого кадра превышает бюджет {STARTUP_BUDGET_MS} мс")
+        if self.measure_startup:
+            write_json_atomic(STARTUP_REPORT, {
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "launcher_version": LAUNCHER_VERSION,
+                "startup_ms": round(self.startup_ms),
+                "budget_ms": STARTUP_BUDGET_MS,
+                "within_budget": self.startup_ms <= STARTUP_BUDGET_MS,
+            })
+            if sys.stdout is not None:
+                print(f"Время до первого кадра: {self.startup_ms:.0f} мс (бюджет {STARTUP_BUDGET_MS} мс)")
+            self.destroy()
+            return
+
+        # Актуальный список сборок загружается в фоне и обновляет выпадающий список
+        Job(self.refresh_builds, self.events).start()
+        Job(self.update_launcher, self.events).start()
+        self.warm_build(self.build_var.get())
 
     def apply_theme(self):
         logging.debug(f"Применение темы: {self.theme}")
@@ -80,11 +1787,23 @@ class MinecraftLauncher(tk.Tk):
         self.build_var = tk.StringVar(self)
         self.build_menu = ttk.Combobox(frame, textvariable=self.build_var, values=self.builds)
         self.build_var.set(self.selected_build)
+        self.build_menu.bind("<<ComboboxSelected>>", self.on_build_selected)
         self.build_menu.pack(pady=5)
 
         ttk.Button(frame, text="Выбрать скин", command=self.choose_skin).pack(pady=5)
         ttk.Button(frame, text="Настройки", command=self.open_settings).pack(pady=5)
-        ttk.Button(frame, text="Запустить", command=self.launch_game).pack(pady=20)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=(15, 5))
+        self.launch_button = ttk.Button(button_frame, text="Запустить", command=self.launch_game)
+        self.launch_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Отмена", command=self.cancel_job, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(frame, variable=self.progress_var, maximum=100, length=300).pack(pady=5)
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(frame, textvariable=self.status_var).pack(pady=2)
 
     def choose_skin(self):
         logging.debug("Открытие диалога выбора скина")
@@ -103,86 +1822,50 @@ class MinecraftLauncher(tk.Tk):
         shutil.copy(skin_path, os.path.join(skin_directory, f"{nickname}.png"))
         logging.info(f"Скин успешно применен для {nickname}")
 
-    def load_settings(self):
-        logging.debug("Загрузка настроек из settings.json")
-        try:
-            with open("settings.json", "r") as f:
-                settings = json.load(f)
-                logging.info("Настройки загружены успешно")
-                return settings
-        except FileNotFoundError:
-            logging.warning("Файл настроек не найден, загрузка настроек по умолчанию")
-            return {}
-
     def save_settings(self):
-        logging.debug("Сохранение настроек в settings.json")
-        self.settings["nickname"] = self.nickname_entry.get()
-        self.settings["selected_build"] = self.build_var.get()
-        with open("settings.json", "w") as f:
-            json.dump(self.settings, f, indent=4)
-        logging.info("Настройки сохранены")
+        self.settings.update(nickname=self.nickname_entry.get(), selected_build=self.build_var.get())
+
+    def refresh_builds(self, job):
+        import requests
 
-    def load_builds(self):
-        logging.debug("Загрузка доступных сборок с сервера")
         try:
-            response = requests.get("http://178.173.82.2:1010/api/builds")
-            response.raise_for_status()
-            builds = response.json()
-            logging.info(f"Сборки успешно загружены: {builds}")
-            return builds
+            job.post("builds", builds=fetch_builds(BUILDS_TIMEOUT))
         except requests.RequestException as e:
             logging.error(f"Ошибка при загрузке сборок: {e}")
-            messagebox.showerror("Error", "Failed to load builds")
-            return []
+            job.post("builds", builds=None)
 
-    def download_build(self, build_name):
-        logging.debug(f"Загрузка сборки: {build_name}")
-        build_path = os.path.join("builds", build_name)
-        os.makedirs(build_path, exist_ok=True)
+    def update_launcher(self, job):
+        import requests
 
-        for folder in ["mods", "shaderpacks", "resourcepacks", "other"]:
-            folder_path = os.path.join(build_path, folder)
-            os.makedirs(folder_path, exist_ok=True)
+        try:
+            version = check_for_update(job)
+        except (requests.RequestException, OSError, KeyError, ValueError) as e:
+            logging.warning(f"Не удалось обновить лаунчер: {e}")
+            return
+        if version:
+            job.post("update_ready", version=version)
 
-            logging.info(f"Загрузка файлов для сборки {build_name} в папку {folder}")
-            try:
-                response = requests.get(f"http://178.173.82.2:1010/api/build/{build_name}")
-                response.raise_for_status()
-                build_info = response.json()
-                logging.debug(f"Получена информация о сборке: {build_info}")
-
-                for file_info in build_info.get(folder, []):
-                    if "name" in file_info:
-                        file_name = file_info["name"]
-                        file_path = os.path.join(folder_path, file_name)
-
-                        url = f"http://178.173.82.2:1010/api/build/download/{build_name}/{folder}/{file_name}"
-                        with requests.get(url, stream=True) as r:
-                            r.raise_for_status()
-                            with open(file_path, 'wb') as f:
-                                shutil.copyfileobj(r.raw, f)
-                            logging.info(f"Файл {file_name} успешно загружен")
-
-                        # Проверяем, является ли файл ZIP-архивом, и разархивируем его
-                        if folder == "other" and file_name.endswith(".zip"):
-                            logging.info(f"Разархивирование файла {file_name} в директорию {build_path}")
-                            try:
-                                with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                                    zip_ref.extractall(build_path)
-                                logging.info(f"Архив {file_name} успешно разархивирован")
-                            except zipfile.BadZipFile:
-                                logging.error(f"Файл {file_name} повреждён или не является ZIP-архивом")
-                    else:
-                        logging.error(f"Отсутствует поле 'name' в информации о файле: {file_info}")
-            except requests.RequestException as e:
-                logging.error(f"Ошибка при загрузке файлов для сборки {build_name} в папке {folder}: {e}")
-                messagebox.showerror("Error", f"Failed to download files for {build_name} in {folder}")
+    def update_builds(self, builds):
+        self.server_online = builds is not None
+        if builds is None:
+            if self.job is not None:
                 return
+            if self.builds_timestamp:
+                saved = time.strftime("%d.%m.%Y %H:%M", time.localtime(self.builds_timestamp))
+                self.status_var.set(f"Сервер недоступен, список сборок от {saved}")
+            else:
+                self.status_var.set("Сервер недоступен")
+            return
+        self.builds = builds
+        self.build_menu.config(values=self.builds)
 
     def launch_game(self):
         nickname = self.nickname_entry.get()
         build = self.build_var.get()
         logging.debug(f"Запуск игры: никнейм - {nickname}, сборка - {build}")
+        if self.job is not None:
+            logging.debug("Запуск уже выполняется")
+            return
         if not nickname:
             logging.error("Не введен никнейм")
             messagebox.showerror("Error", "Please enter a nickname")
@@ -193,102 +1876,259 @@ class MinecraftLauncher(tk.Tk):
             return
 
         self.save_settings()
-        self.download_build(build)
-        self.run_minecraft(nickname, build)
+        warm_job, warm_state = self.take_warm_state(build)
+        self.start_job(lambda job: self.launch_job(job, nickname, build, warm_job, warm_state))
 
-    def run_minecraft(self, nickname, build):
-        ram = self.settings.get("ram", 4000)
-        close_launcher = self.settings.get("close_launcher", False)
+    def launch_job(self, job, nickname, build, warm_job=None, warm_state=None):
+        # Выполняется в фоновом потоке: интерфейс обновляется только через job.post
+        import requests
 
-        try:
-            logging.debug(f"Получение информации о версии сборки {build}")
-            response = requests.get(f"http://178.173.82.2:1010/api/build/{build}")
-            response.raise_for_status()
-            build_info = response.json()
-            logging.debug(f"Информация о сборке получена: {build_info}")
-            version_name = build_info["version"]
-            mc_directory = os.path.join("builds", build_info["name"])
-
-            logging.debug(f"Получение информации о версиях Minecraft")
-            response = requests.get(f"http://178.173.82.2:1010/api/versions")
-            response.raise_for_status()
-            versions = response.json()
-            if version_name not in versions:
-                raise ValueError(f"Версия {version_name} не найдена среди доступных версий")
-            version_details = versions[version_name]
-            forge_version = version_details["forge_version"]
-            name_version = version_details["name"]
-
-            version_path = os.path.join(mc_directory, "versions", version_name)
-            logging.debug(f"Путь до версии: {version_path}")
-            if not os.path.exists(version_path):
-                os.makedirs(version_path, exist_ok=True)
-                logging.debug(f"Загрузка версии Minecraft {name_version}")
-                try:
-                    response = requests.get(f"http://178.173.82.2:1010/api/version/download/{version_name}")
-                    response.raise_for_status()
-                    with open(os.path.join(version_path, f"{forge_version}.jar"), "wb") as f:
-                        f.write(response.content)
-                except requests.exceptions.RequestException as e:
-                    logging.error(f"Ошибка при загрузке версии Minecraft {forge_version}: {e}")
-                except Exception as e:
-                    logging.error(f"Ошибка при сохранении версии Minecraft {forge_version}: {e}")
-
-            # Загрузка данных из файла
-            with open('settings.json', 'r') as file:
-                data = json.load(file)
-
-            if build in data['builds']:
-                logging.debug("Сборка уже установлена")
+        if warm_job is not None:
+            # Подготовка этой сборки ещё идёт: она продолжается без ограничения скорости, запуск ждёт её завершения
+            job.post("status", text="Завершение подготовки сборки...")
+            while warm_job.thread.is_alive():
+                job.check_cancelled()
+                warm_job.thread.join(timeout=0.2)
+            warm_state = warm_job.result
+
+        with hold_build_lock(build, job):
+            if warm_state is not None:
+                logging.info(f"Сборка {build} подготовлена заранее, проверка файлов пропущена")
+                metadata = warm_state["metadata"]
             else:
-                logging.debug("Сборка ещё не установлена")
-                # Добавляем данные в массив builds
-                data['builds'].append(build)
-
-                # Запись обновленных данных обратно в файл
-                with open('settings.json', 'w') as file:
-                    json.dump(data, file, indent=4)
-                
-                logging.debug(f"Установка версии Forge: {forge_version} в {mc_directory}")
-                mll.forge.install_forge_version(forge_version, mc_directory)
-
-            options = {
-                "username": nickname,
-                "uuid": str(uuid.uuid4()),
-                "token": "0",
-                "jvmArguments": [f"-Xmx{ram}M"]
-            }
-            logging.debug(f"Получение команды запуска Minecraft для версии: {version_name}")
-            command = mll.command.get_minecraft_command(name_version, mc_directory, options)
+                job.post("status", text="Получение информации о сборке...")
+                try:
+                    metadata = resolve_build(build, offline=self.server_online is False)
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    logging.error(f"Ошибка при получении информации о сборке {build}: {e}")
+                    raise RuntimeError(f"Failed to load build info for {build}: {e}") from e
+                job.check_cancelled()
+                download_build(build, metadata["build"], job, self.settings.get("download_workers"))
+                job.check_cancelled()
+            self.run_minecraft(job, nickname, build, metadata)
+        collect_garbage()
+
+    def on_build_selected(self, event=None):
+        self.save_settings()
+        self.warm_build(self.build_var.get())
+
+    def warm_build(self, build):
+        # Выбранная сборка проверяется, загружается и устанавливается в фоне, пока пользователь не нажал «Запустить»
+        if not build or self.job is not None or build == self.running_build:
+            return
+        if self.warm_job is not None:
+            if self.warm_job.build == build:
+                return
+            self.warm_job.cancel()
+        self.warm_state = None
+        self.warm_job = Job(lambda job: self.warm_job_target(job, build), self.events, TokenBucket(WARM_BANDWIDTH))
+        self.warm_job.build = build
+        self.warm_job.start()
+
+    def warm_job_target(self, job, build):
+        metadata = resolve_build(build, offline=self.server_online is False)
+        job.check_cancelled()
+        with hold_build_lock(build, job):
+            download_build(build, metadata["build"], job, WARM_WORKERS)
+            job.check_cancelled()
+            install_build(build, metadata, job, self.settings)
+            job.check_cancelled()
+            # Заодно строится и кэшируется команда запуска
+            get_launch_command(self.settings.get("nickname") or "Player", metadata, [])
+        logging.info(f"Сборка {build} подготовлена к запуску")
+        return {"build": build, "metadata": metadata, "time": time.monotonic()}
+
+    def take_warm_state(self, build):
+        # Вызывается при нажатии «Запустить»: подготовка другой сборки отменяется, подготовка этой ускоряется
+        warm_job = self.warm_job
+        warm_state = self.warm_state
+        self.warm_job = None
+        self.warm_state = None
+        if warm_job is not None and warm_job.build != build:
+            warm_job.cancel()
+            warm_job = None
+        elif warm_job is not None:
+            warm_job.limiter.set_rate(None)
+        self.handoff_job = warm_job
+        if warm_state is not None and (warm_state["build"] != build or time.monotonic() - warm_state["time"] > WARM_MAX_AGE):
+            warm_state = None
+        return warm_job, warm_state
+
+    def handle_warm_event(self, job, kind, data):
+        if kind == "done":
+            if job is self.warm_job:
+                self.warm_job = None
+                self.warm_state = data["result"]
+            if self.job is None:
+                self.progress_var.set(0)
+                self.status_var.set(f"Сборка {data['result']['build']} готова к запуску")
+        elif kind in ("error", "cancelled"):
+            # Ошибка подготовки не показывается: при запуске сборка будет проверена заново
+            if job is self.warm_job:
+                self.warm_job = None
+            if self.job is None:
+                self.progress_var.set(0)
+                self.status_var.set("")
+        elif job is self.handoff_job or (job is self.warm_job and self.job is None):
+            # Ход подготовки виден, пока пользователь ничего не запускает или пока запуск её ждёт
+            self.handle_event(kind, data)
+
+    def run_minecraft(self, job, nickname, build, metadata):
+        close_launcher = self.settings.get("close_launcher")
+
+        try:
+            install_build(build, metadata, job, self.settings)
+            job.check_cancelled()
+            profile = jvm_profile(os.path.join("builds", build), metadata, self.settings)
+            command = get_launch_command(nickname, metadata, profile["args"])
 
             logging.info(f"Запуск Minecraft с командой: {command}")
             logging.debug(f"Команда: {command}")
 
+            creationflags = 0
+            if close_launcher or self.settings.get("dev_mode"):
+                creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+            GameProcess(command, build, self.events, profile["heap_mb"], creationflags).start()
             if close_launcher:
-                self.withdraw()  # Скрытие лаунчера во время игры
-                process = subprocess.Popen(command, creationflags=subprocess.CREATE_NO_WINDOW)
-                process.wait()
-                self.deiconify()  # Восстановление лаунчера после закрытия игры
-            else:
-                if self.settings.get("dev_mode", False):
-                    subprocess.Popen(command, creationflags=subprocess.CREATE_NO_WINDOW)
-                else:
-                    subprocess.Popen(command)
+                job.post("hide")  # Скрытие лаунчера во время игры, окно вернётся после завершения игры
 
+        except JobCancelled:
+            raise
         except Exception as e:
             logging.error(f"Ошибка при запуске игры: {e}")
-            messagebox.showerror("Error", f"Failed to launch game: {e}")
+            raise RuntimeError(f"Failed to launch game: {e}") from e
+
+    def start_job(self, target):
+        self.job = Job(target, self.events).start()
+        self.launch_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+
+    def cancel_job(self):
+        if self.job is not None:
+            logging.info("Отмена текущей задачи")
+            self.status_var.set("Отмена...")
+            self.job.cancel()
+            if self.handoff_job is not None:
+                self.handoff_job.cancel()
+
+    def finish_job(self, status=""):
+        self.job = None
+        self.handoff_job = None
+        self.launch_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_var.set(0)
+        self.status_var.set(status)
+
+    def poll_events(self):
+        try:
+            while True:
+                job, kind, data = self.events.get_nowait()
+                if kind == "builds":
+                    self.update_builds(data["builds"])
+                elif kind in ("game_started", "game_telemetry", "game_exited"):
+                    self.handle_game_event(kind, data)
+                elif kind == "update_ready":
+                    logging.info(f"Лаунчер обновлён до версии {data['version']}, изменения вступят в силу после перезапуска")
+                    if self.job is None:
+                        self.status_var.set(f"Версия {data['version']} установится при следующем запуске")
+                elif job is self.job:
+                    self.handle_event(kind, data)
+                elif getattr(job, "build", None) is not None:
+                    self.handle_warm_event(job, kind, data)
+        except queue.Empty:
+            pass
+        self.after(EVENT_POLL_MS, self.poll_events)
+
+    def handle_event(self, kind, data):
+        if kind == "status":
+            self.status_var.set(data["text"])
+        elif kind == "progress":
+            self.show_progress(data)
+        elif kind == "install_progress":
+            if data["maximum"]:
+                self.progress_var.set(data["value"] / data["maximum"] * 100)
+        elif kind == "hide":
+            self.withdraw()
+        elif kind == "show":
+            self.deiconify()
+        elif kind == "error":
+            self.finish_job()
+            messagebox.showerror("Error", str(data["error"]))
+        elif kind == "cancelled":
+            self.finish_job("Отменено")
+        elif kind == "done":
+            self.finish_job("Игра запущена")
+
+    def handle_game_event(self, kind, data):
+        if kind == "game_started":
+            # Пока игра запущена, её сборка не подготавливается в фоне: файлы заняты игрой
+            self.running_build = data["build"]
+            return
+        if kind == "game_telemetry":
+            if self.job is None:
+                self.status_var.set(f"Игра запущена · память {data['rss_mb']} МБ · CPU {data['cpu']:.0f}%")
+            return
+
+        self.running_build = None
+        self.deiconify()  # Восстановление лаунчера после закрытия игры
+        if self.job is None:
+            self.status_var.set("")
+        if data["oom"]:
+            peak = f", пик {data['peak_rss_mb']} МБ" if data["peak_rss_mb"] else ""
+            messagebox.showerror(
+                "Error",
+                f"Игре не хватило памяти (выделено {data['xmx_mb']} МБ{peak}). " + (
+                    "Отключите автоматический подбор памяти в настройках и задайте объём вручную."
+                    if self.settings.get("jvm_auto")
+                    else "Увеличьте выделенную память в настройках."
+                ),
+            )
+        elif data["crashed"]:
+            details = data["crash_report"] or data["log"]
+            messagebox.showerror("Error", f"Игра завершилась с ошибкой (код {data['exit_code']}). Подробности: {details}")
+
+    def show_progress(self, snapshot):
+        done_bytes = snapshot["done_bytes"]
+        total_bytes = snapshot["total_bytes"]
+        if total_bytes:
+            self.progress_var.set(min(done_bytes / total_bytes * 100, 100))
+        elif snapshot["total_files"]:
+            self.progress_var.set(snapshot["done_files"] / snapshot["total_files"] * 100)
+
+        text = (
+            f"{done_bytes / 1048576:.1f} / {total_bytes / 1048576:.1f} МБ · "
+            f"файлы {snapshot['done_files']}/{snapshot['total_files']} · "
+            f"{snapshot['files_per_sec']:.1f} файл/с"
+        )
+        speed = snapshot["bytes_per_sec"]
+        if speed > 0 and total_bytes > done_bytes:
+            eta = int((total_bytes - done_bytes) / speed)
+            text += f" · осталось {eta // 60}:{eta % 60:02d}"
+        self.status_var.set(text)
+
+    def on_close(self):
+        if self.warm_job is not None:
+            self.warm_job.cancel()
+        if self.job is not None:
+            self.job.cancel()
+            self.job.thread.join(timeout=2)
+        self.settings.flush()
+        self.destroy()
 
     def open_settings(self):
         logging.debug("Открытие окна настроек")
         settings_window = tk.Toplevel(self)
         settings_window.title("Настройки")
-        settings_window.geometry("300x400")
+        settings_window.geometry("300x440")
+
+        jvm_auto_var = tk.BooleanVar(value=self.settings.get("jvm_auto"))
+        jvm_auto_check = ttk.Checkbutton(settings_window, text="Подбирать память автоматически", variable=jvm_auto_var)
+        jvm_auto_check.pack(pady=5)
 
         ttk.Label(settings_window, text="Выделенная память (MB):").pack(pady=5)
         ram_value = tk.IntVar()
         ram_slider = ttk.Scale(settings_window, from_=1024, to=16384, orient=tk.HORIZONTAL, variable=ram_value)
-        ram_slider.set(self.settings.get("ram", 4000))
+        ram_slider.set(self.settings.get("ram"))
         ram_slider.pack(pady=5)
 
         ram_label = ttk.Label(settings_window, text=f"{ram_slider.get()} MB")
@@ -298,23 +2138,33 @@ class MinecraftLauncher(tk.Tk):
             ram_label.config(text=f"{int(float(value))} MB")
         ram_slider.config(command=update_ram_label)
 
-        dev_mode_var = tk.BooleanVar(value=self.settings.get("dev_mode", False))
+        # Ползунок действует только при ручной настройке памяти
+        def update_ram_state():
+            ram_slider.state(["disabled"] if jvm_auto_var.get() else ["!disabled"])
+        jvm_auto_check.config(command=update_ram_state)
+        update_ram_state()
+
+        dev_mode_var = tk.BooleanVar(value=self.settings.get("dev_mode"))
         ttk.Checkbutton(settings_window, text="Запуск в режиме разработчика", variable=dev_mode_var).pack(pady=5)
 
         theme_var = tk.StringVar(value=self.theme)
         ttk.Radiobutton(settings_window, text="Светлая тема", variable=theme_var, value="light").pack(pady=5)
         ttk.Radiobutton(settings_window, text="Тёмная тема", variable=theme_var, value="dark").pack(pady=5)
 
-        close_launcher_var = tk.BooleanVar(value=self.settings.get("close_launcher", False))
+        close_launcher_var = tk.BooleanVar(value=self.settings.get("close_launcher"))
         ttk.Checkbutton(settings_window, text="Закрыть лаунчер при запуске игры", variable=close_launcher_var).pack(pady=5)
 
         ttk.Button(settings_window, text="Показать файлы игры", command=self.show_game_files).pack(pady=10)
 
         def save_and_close():
-            self.settings["ram"] = int(ram_slider.get())
-            self.settings["dev_mode"] = dev_mode_var.get()
-            self.settings["theme"] = theme_var.get()
-            self.settings["close_launcher"] = close_launcher_var.get()
+            self.settings.update(
+                ram=int(ram_slider.get()),
+                jvm_auto=jvm_auto_var.get(),
+                dev_mode=dev_mode_var.get(),
+                theme=theme_var.get(),
+                close_launcher=close_launcher_var.get(),
+            )
+            self.theme = self.settings.get("theme")
             self.apply_theme()
             self.save_settings()
             settings_window.destroy()
@@ -337,5 +2187,10 @@ class MinecraftLauncher(tk.Tk):
 
 if __name__ == "__main__":
     logging.info("Запуск Minecraft Launcher")
-    app = MinecraftLauncher()
+    # --startup-time: замерить время до первого кадра, записать его в logs/startup_time.json (и вывести в консоль,
+    # если она есть) и выйти; код 1 при превышении бюджета
+    measure_startup = "--startup-time" in sys.argv[1:]
+    app = MinecraftLauncher(measure_startup)
     app.mainloop()
+    if measure_startup and app.startup_ms is not None and app.startup_ms > STARTUP_BUDGET_MS:
+        sys.exit(1)
@@ -0,0 +1,412 @@
+import argparse  # Разбор параметров командной строки.
+import hashlib  # Контрольные суммы файлов тестовой сборки.
+import http.server  # Локальный сервер вместо сервера сборок.
+import io  # Сборка ZIP-архива в памяти.
+import json  # Работа с JSON-файлами.
+import logging  # Логирование событий.
+import multiprocessing  # Каждый прогон в отдельном процессе, чтобы пик памяти считался только для него.
+import os  # Работа с файловой системой.
+import platform  # Информация о системе для отчёта.
+import random  # Детерминированное содержимое тестовых файлов.
+import shutil  # Очистка рабочего каталога.
+import sys  # Версия Python для отчёта.
+import tempfile  # Временный рабочий каталог.
+import threading  # Поток локального сервера.
+import time  # Замер времени этапов.
+import zipfile  # Тестовый архив для папки other.
+from urllib.parse import unquote  # Разбор путей запросов.
+
+import app  # Конвейер запуска лаунчера.
+
+# Бенчмарк конвейера запуска: поднимает локальный сервер с API сборок, прогоняет этапы лаунчера без Tk
+# и сохраняет время каждого этапа, объём переданных данных и пиковое потребление памяти в JSON.
+# Сервер держит содержимое сборки в памяти, поэтому он и каждый прогон работают в отдельных процессах:
+# пик RSS относится только к конвейеру лаунчера и считается для каждого прогона заново
+
+BUILD_NAME = "Bench"
+VERSION_NAME = "bench-1.0"
+FORGE_VERSION = "bench-forge"
+
+
+def parse_size(value):
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = value.strip().lower().rstrip("b")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def make_payload(rng, size):
+    return rng.randbytes(size)
+
+
+def make_archive(rng, entries, entry_size):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for index in range(entries):
+            # Конфиги сжимаются хорошо, поэтому содержимое — повторяющийся текст
+            line = f"option_{index}={rng.randint(0, 10 ** 6)}\n".encode()
+            zip_ref.writestr(f"config/bench_{index}.cfg", line * max(1, entry_size // len(line)))
+    return buffer.getvalue()
+
+
+class SharedCounters:
+    # Счётчики сервера в разделяемой памяти: их пишет процесс сервера, а читает процесс прогона
+    def __init__(self, context):
+        self.bytes_sent = context.Value("q", 0)
+        self.requests = context.Value("q", 0)
+
+    def add(self, bytes_sent=0, requests=0):
+        with self.bytes_sent.get_lock():
+            self.bytes_sent.value += bytes_sent
+        with self.requests.get_lock():
+            self.requests.value += requests
+
+    def counters(self):
+        return self.bytes_sent.value, self.requests.value
+
+
+class MockBuildServer:
+    # Заменитель сервера сборок с настраиваемыми задержкой и пропускной способностью
+    def __init__(self, args, counters):
+        rng = random.Random(args.seed)
+        self.latency = args.latency_ms / 1000
+        self.bandwidth = args.bandwidth_mbps * 1024 * 1024 / 8 if args.bandwidth_mbps else 0
+        self.lock = threading.Lock()
+        self.next_send = 0.0
+        self.shared = counters
+
+        self.files = {"mods": {}, "shaderpacks": {}, "resourcepacks": {}, "other": {}}
+        for index in range(args.files):
+            self.files["mods"][f"mod_{index}.jar"] = make_payload(rng, args.file_size)
+        for index in range(args.archives):
+            self.files["other"][f"configs_{index}.zip"] = make_archive(rng, args.archive_entries, args.archive_entry_size)
+        self.version_jar = make_payload(rng, args.version_size)
+
+        build_info = {"name": BUILD_NAME, "version": VERSION_NAME}
+        for folder, files in self.files.items():
+            build_info[folder] = [
+                {"name": name, "size": len(data), "hash": hashlib.sha256(data).hexdigest()}
+                for name, data in files.items()
+            ]
+        versions = {
+            VERSION_NAME: {
+                "forge_version": args.forge_version or FORGE_VERSION,
+                "name": args.version_name or VERSION_NAME,
+                "size": len(self.version_jar),
+                "hash": hashlib.sha256(self.version_jar).hexdigest(),
+            }
+        }
+        self.json_routes = {
+            "/api/builds": json.dumps([BUILD_NAME]).encode(),
+            f"/api/build/{BUILD_NAME}": json.dumps(build_info).encode(),
+            "/api/versions": json.dumps(versions).encode(),
+        }
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def counters(self):
+        return self.shared.counters()
+
+    def lookup(self, path):
+        if path in self.json_routes:
+            return self.json_routes[path], "application/json"
+        if path == f"/api/version/download/{VERSION_NAME}":
+            return self.version_jar, "application/java-archive"
+        prefix = f"/api/build/download/{BUILD_NAME}/"
+        if path.startswith(prefix):
+            folder, _, name = path[len(prefix):].partition("/")
+            data = self.files.get(folder, {}).get(name)
+            if data is not None:
+                return data, "application/octet-stream"
+        return None, None
+
+    def handle(self, handler):
+        if self.latency:
+            time.sleep(self.latency)
+        self.shared.add(requests=1)
+
+        body, content_type = self.lookup(unquote(handler.path))
+        if body is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if content_type == "application/json" and handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        start = 0
+        range_header = handler.headers.get("Range", "")
+        if range_header.startswith("bytes=") and range_header.endswith("-"):
+            start = int(range_header[6:-1])
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            handler.send_response(200)
+        payload = body[start:]
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(payload)))
+        if content_type == "application/json":
+            handler.send_header("ETag", etag)
+        handler.end_headers()
+        self.send_throttled(handler, payload)
+
+    def send_throttled(self, handler, payload):
+        # Пропускная способность общая для всех соединений: каждый блок занимает свой интервал времени
+        chunk_size = 64 * 1024
+        for offset in range(0, len(payload), chunk_size):
+            chunk = payload[offset:offset + chunk_size]
+            if self.bandwidth:
+                with self.lock:
+                    slot = max(time.monotonic(), self.next_send) + len(chunk) / self.bandwidth
+                    self.next_send = slot
+                time.sleep(max(0.0, slot - time.monotonic()))
+            handler.wfile.write(chunk)
+            self.shared.add(bytes_sent=len(chunk))
+
+
+def peak_rss_mb():
+    # VmHWM сбрасывается при exec, а ru_maxrss в Linux наследует пик родительского процесса
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # В Linux значение в килобайтах, в macOS — в байтах
+        return peak / 1024 / 1024 if platform.system() == "Darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+
+def write_synthetic_version(mc_directory, name, libraries):
+    # Описание версии с заданным числом библиотек, чтобы замерить построение команды без установки Forge
+    version_path = os.path.join(mc_directory, "versions", name)
+    if os.path.exists(os.path.join(version_path, f"{name}.json")):
+        return
+    os.makedirs(version_path, exist_ok=True)
+    data = {
+        "id": name,
+        "type": "release",
+        "mainClass": "net.minecraft.client.main.Main",
+        "assets": "bench",
+        "minecraftArguments": "--username ${auth_player_name} --version ${version_name} --gameDir ${game_directory} "
+                              "--assetsDir ${assets_root} --uuid ${auth_uuid} --accessToken ${auth_access_token}",
+        "libraries": [{"name": f"org.bench:library{index}:1.0.{index}"} for index in range(libraries)],
+    }
+    with open(os.path.join(version_path, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+class StageTimer:
+    def __init__(self, counters):
+        self.server = counters
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        bytes_before, requests_before = self.server.counters()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        bytes_after, requests_after = self.server.counters()
+        self.stages[name] = {
+            "seconds": round(elapsed, 4),
+            "bytes": bytes_after - bytes_before,
+            "requests": requests_after - requests_before,
+        }
+        return result
+
+
+def run_pipeline(counters, args, label):
+    job = app.Job(None)
+    timer = StageTimer(counters)
+
+    # Распаковка вызывается внутри download_build, поэтому её время считается отдельно
+    extract_time = [0.0]
+    extract_archive = app.extract_archive
+
+    def timed_extract(*extract_args, **extract_kwargs):
+        started = time.perf_counter()
+        try:
+            return extract_archive(*extract_args, **extract_kwargs)
+        finally:
+            extract_time[0] += time.perf_counter() - started
+
+    app.extract_archive = timed_extract
+    try:
+        timer.run("load_builds", app.fetch_builds)
+        metadata = timer.run("resolve_build", app.resolve_build, BUILD_NAME)
+        timer.run("download_build", app.download_build, BUILD_NAME, metadata["build"], job, args.workers)
+    finally:
+        app.extract_archive = extract_archive
+    timer.stages["download_build"]["seconds"] = round(timer.stages["download_build"]["seconds"] - extract_time[0], 4)
+    timer.stages["extract"] = {"seconds": round(extract_time[0], 4), "bytes": 0, "requests": 0}
+
+    mc_directory = os.path.join("builds", BUILD_NAME)
+    timer.run("install_build", app.install_build, BUILD_NAME, metadata, job, app.SettingsStore())
+    if not args.forge_version:
+        write_synthetic_version(mc_directory, metadata["version"]["name"], args.libraries)
+    timer.run("get_minecraft_command", app.get_launch_command, "Bench", metadata, ["-Xmx4096M"])
+
+    return {
+        "label": label,
+        "stages": timer.stages,
+        "total_seconds": round(sum(stage["seconds"] for stage in timer.stages.values()), 4),
+        "bytes_moved": sum(stage["bytes"] for stage in timer.stages.values()),
+        "requests": sum(stage["requests"] for stage in timer.stages.values()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_server(args, counters, url_queue):
+    server = MockBuildServer(args, counters).start()
+    url_queue.put(server.url)
+    server.thread.join()
+
+
+def run_in_process(url, counters, args, label, results_queue):
+    # Точка входа процесса прогона; рабочий каталог наследуется от процесса бенчмарка
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    app.API_URL = url
+    try:
+        results_queue.put(run_pipeline(counters, args, label))
+    except BaseException:
+        import traceback
+        results_queue.put(traceback.format_exc())
+
+
+def print_report(results, baseline=None):
+    baseline_runs = {run["label"]: run for run in (baseline or {}).get("runs", [])}
+    for run in results["runs"]:
+        print(f"\n[{run['label']}] всего {run['total_seconds']:.3f} с, "
+              f"{run['bytes_moved'] / 1048576:.1f} МБ, запросов {run['requests']}, "
+              f"пик RSS {run['peak_rss_mb'] or 0:.0f} МБ")
+        previous = baseline_runs.get(run["label"], {}).get("stages", {})
+        for name, stage in run["stages"].items():
+            line = f"  {name:<24}{stage['seconds']:>9.3f} с{stage['bytes'] / 1048576:>10.1f} МБ{stage['requests']:>7}"
+            if name in previous:
+                delta = stage["seconds"] - previous[name]["seconds"]
+                line += f"   {delta:+.3f} с"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера запуска MoonTea Launcher")
+    parser.add_argument("--files", type=int, default=200, help="число модов в сборке")
+    parser.add_argument("--file-size", type=parse_size, default=parse_size("256k"), help="размер одного мода")
+    parser.add_argument("--archives", type=int, default=1, help="число ZIP-архивов в папке other")
+    parser.add_argument("--archive-entries", type=int, default=300, help="число файлов в каждом архиве")
+    parser.add_argument("--archive-entry-size", type=parse_size, default=parse_size("4k"), help="размер файла в архиве")
+    parser.add_argument("--version-size", type=parse_size, default=parse_size("8m"), help="размер jar-файла версии")
+    parser.add_argument("--libraries", type=int, default=300, help="число библиотек в синтетическом описании версии")
+    parser.add_argument("--latency-ms", type=float, default=0, help="задержка сервера на каждый запрос")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="пропускная способность, Мбит/с (0 — без ограничения)")
+    parser.add_argument("--workers", type=int, default=app.DOWNLOAD_WORKERS, help="число потоков загрузки")
+    parser.add_argument("--runs", type=int, default=2, help="число запусков: первый холодный, остальные повторные")
+    parser.add_argument("--forge-version", help="реальная версия Forge для установки (по умолчанию установка пропускается)")
+    parser.add_argument("--version-name", help="имя установленной версии Forge для построения команды")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора содержимого")
+    parser.add_argument("--workdir", help="рабочий каталог (по умолчанию временный)")
+    parser.add_argument("--output", default="bench_results.json", help="файл для сохранения результатов")
+    parser.add_argument("--compare", help="JSON с прошлыми результатами для сравнения")
+    parser.add_argument("--verbose", action="store_true", help="выводить журнал лаунчера")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    output_path = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="moontea-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    previous_cwd = os.getcwd()
+    # spawn, а не fork: процесс прогона не должен наследовать память сервера
+    context = multiprocessing.get_context("spawn")
+    counters = SharedCounters(context)
+    url_queue = context.Queue()
+    server = context.Process(target=run_server, args=(args, counters, url_queue), daemon=True)
+    server.start()
+    server_url = url_queue.get()
+    try:
+        os.chdir(workdir)
+        # Без реальной версии Forge сборка помечается установленной, чтобы install_build не обращался к Forge
+        if not args.forge_version:
+            app.SettingsStore().mark_installed(BUILD_NAME, None, None)
+
+        runs = []
+        for index in range(max(1, args.runs)):
+            label = "cold" if index == 0 else f"warm{index}"
+            results_queue = context.Queue()
+            process = context.Process(target=run_in_process, args=(server_url, counters, args, label, results_queue))
+            process.start()
+            run = results_queue.get()
+            process.join()
+            if isinstance(run, str):
+                raise RuntimeError(f"Прогон {label} завершился с ошибкой:\n{run}")
+            runs.append(run)
+    finally:
+        os.chdir(previous_cwd)
+        server.terminate()
+        server.join()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+        "runs": runs,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print_report(results, baseline)
+    print(f"\nРезультаты сохранены в {output_path}")
+
+
+if __name__ == "__main__":
+    main()
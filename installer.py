@@ -1,22 +1,143 @@
 import os
+import json
+import hashlib
+import logging
+import queue
+import sys
+import tempfile
+import threading
 import winshell
-from urllib.request import urlretrieve
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-def download_files(urls, destination_folder, progress_callback):
-    total_files = len(urls)
-    for index, url in enumerate(urls):
-        filename = os.path.basename(url)
-        if filename == "exe":
-            filename = "MoonTea.exe"
-        elif filename == "ico":
-            filename = "icon.ico"
-        elif filename == "bg":
-            filename = "background.jpg"
-        destination_path = os.path.join(destination_folder, filename)
-        urlretrieve(url, destination_path)
-        progress_callback(index + 1, total_files)
+# Установщик собирается без консоли, поэтому журнал пишется в файл во временном каталоге
+LOG_PATH = os.path.join(tempfile.gettempdir(), "MoonTeaInstaller.log")
+log_handlers = [logging.FileHandler(LOG_PATH, encoding="utf-8")]
+if sys.stderr is not None:
+    log_handlers.append(logging.StreamHandler())
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=log_handlers)
+
+API_URL = "http://178.173.82.2:1010"
+MANIFEST_URL = f"{API_URL}/api/launcher/manifest"
+TIMEOUT = 30
+CHUNK_SIZE = 256 * 1024
+DOWNLOAD_WORKERS = 3
+DOWNLOAD_RETRIES = 5
+
+# Используется, если сервер не отдаёт манифест: размеры и хэши неизвестны, проверяется только длина ответа
+FALLBACK_ARTIFACTS = [
+    {"name": "MoonTea.exe", "url": f"{API_URL}/api/launcher/download/exe"},
+    {"name": "icon.ico", "url": f"{API_URL}/api/launcher/download/ico"},
+    {"name": "background.jpg", "url": f"{API_URL}/api/launcher/download/bg"},
+]
+
+def fetch_manifest():
+    # Манифест: список файлов с именем, адресом, размером и sha256
+    try:
+        with urlopen(MANIFEST_URL, timeout=TIMEOUT) as response:
+            manifest = json.load(response)
+    except (URLError, ValueError, OSError) as e:
+        logging.warning(f"Манифест недоступен ({e}), используется список файлов по умолчанию")
+        return FALLBACK_ARTIFACTS
+    artifacts = manifest.get("files", []) if isinstance(manifest, dict) else manifest
+    for artifact in artifacts:
+        artifact["name"] = os.path.basename(artifact["name"])
+        artifact["url"] = urljoin(API_URL, artifact["url"])
+    return artifacts
+
+class DownloadProgress:
+    def __init__(self, artifacts):
+        self.lock = threading.Lock()
+        self.done = 0
+        self.total = sum(artifact.get("size") or 0 for artifact in artifacts)
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+            return self.done, self.total
+
+    def add_total(self, count):
+        with self.lock:
+            self.total += count
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fetch_part(url, part_path, progress, progress_callback, first_attempt, count_total):
+    # Докачивает .part через Range; если сервер отвечает 200, загрузка начинается заново
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    try:
+        response = urlopen(Request(url, headers=headers), timeout=TIMEOUT)
+    except HTTPError as e:
+        if e.code == 416:
+            os.remove(part_path)
+            return fetch_part(url, part_path, progress, progress_callback, first_attempt, count_total)
+        raise
+    with response:
+        if offset and response.status == 206:
+            mode = "ab"
+        else:
+            mode = "wb"
+            offset = 0
+        length = response.headers.get("Content-Length")
+        expected = offset + int(length) if length is not None else None
+        if count_total and first_attempt and expected is not None:
+            progress.add_total(expected)
+        if offset and first_attempt:
+            # Байты, скачанные при прошлом запуске установщика
+            progress_callback(*progress.add(offset))
+        with open(part_path, mode) as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                f.write(chunk)
+                progress_callback(*progress.add(len(chunk)))
+    size = os.path.getsize(part_path)
+    if expected is not None and size != expected:
+        raise URLError(f"соединение оборвалось: получено {size} из {expected} байт")
+
+def download_artifact(artifact, destination_folder, progress, progress_callback):
+    destination_path = os.path.join(destination_folder, artifact["name"])
+    part_path = destination_path + ".part"
+    expected_size = artifact.get("size")
+    expected_hash = artifact.get("hash")
+
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            fetch_part(artifact["url"], part_path, progress, progress_callback, attempt == 0, expected_size is None)
+            break
+        except (URLError, HTTPException, OSError) as e:
+            # .part сохраняется: следующая попытка или повторный запуск установщика продолжит загрузку
+            if isinstance(e, HTTPError) or attempt == DOWNLOAD_RETRIES:
+                raise
+            logging.warning(f"Обрыв загрузки {artifact['name']}: {e}, попытка {attempt + 1}/{DOWNLOAD_RETRIES}")
+
+    if expected_size is not None and os.path.getsize(part_path) != expected_size:
+        os.remove(part_path)
+        raise ValueError(f"Размер файла {artifact['name']} не совпадает")
+    if expected_hash and file_sha256(part_path) != expected_hash:
+        os.remove(part_path)
+        raise ValueError(f"Контрольная сумма файла {artifact['name']} не совпадает")
+    os.replace(part_path, destination_path)
+
+def download_files(artifacts, destination_folder, progress_callback):
+    # Файлы загружаются параллельно во временные .part и переносятся на место только после проверки
+    progress = DownloadProgress(artifacts)
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = [
+            executor.submit(download_artifact, artifact, destination_folder, progress, progress_callback)
+            for artifact in artifacts
+        ]
+        for future in futures:
+            future.result()
 
 def create_shortcut(target_file, shortcut_name, shortcut_folder, working_directory):
     shortcut_path = os.path.join(shortcut_folder, f"{shortcut_name}.lnk")
@@ -26,17 +147,15 @@ def create_shortcut(target_file, shortcut_name, shortcut_folder, working_directo
         link.description = f"Shortcut to {target_file}"
         link.write()
 
-def start_installation(destination_folder, create_desktop, create_start_menu, progress_callback):
-    file_urls = [
-        "http://178.173.82.2:1010/api/launcher/download/exe",
-        "http://178.173.82.2:1010/api/launcher/download/ico",
-        "http://178.173.82.2:1010/api/launcher/download/bg"
-    ]
+def download_launcher(destination_folder, progress_callback):
+    artifacts = fetch_manifest()
 
     moontea_folder = os.path.join(destination_folder, "MoonTea")
     os.makedirs(moontea_folder, exist_ok=True)
-    download_files(file_urls, moontea_folder, progress_callback)
+    download_files(artifacts, moontea_folder, progress_callback)
+    return moontea_folder
 
+def create_shortcuts(moontea_folder, create_desktop, create_start_menu):
     moon_tea_exe_path = os.path.join(moontea_folder, "MoonTea.exe")
 
     if create_desktop:
@@ -45,14 +164,56 @@ def start_installation(destination_folder, create_desktop, create_start_menu, pr
         start_menu_folder = os.path.join(os.getenv("APPDATA"), "Microsoft\\Windows\\Start Menu\\Programs")
         create_shortcut(moon_tea_exe_path, "MoonTea", start_menu_folder, moontea_folder)
 
+def start_installation(destination_folder, create_desktop, create_start_menu, progress_callback):
+    moontea_folder = download_launcher(destination_folder, progress_callback)
+    create_shortcuts(moontea_folder, create_desktop, create_start_menu)
+
 def main():
+    # Установка идёт в отдельном потоке, окно получает прогресс через очередь
+    events = queue.Queue()
+
     def on_install():
         destination_folder = folder_var.get()
         create_desktop = desktop_var.get()
         create_start_menu = start_menu_var.get()
-        start_installation(destination_folder, create_desktop, create_start_menu, update_progress)
-        messagebox.showinfo("Установка завершена", "Установка завершена")
-        root.quit()
+        install_button.config(state=tk.DISABLED)
+        threading.Thread(target=install_worker, args=(destination_folder,), daemon=True).start()
+        root.after(100, poll_events, create_desktop, create_start_menu)
+
+    def install_worker(destination_folder):
+        try:
+            moontea_folder = download_launcher(destination_folder, update_progress)
+        except Exception as e:
+            logging.exception(f"Ошибка установки: {e}")
+            events.put(("error", e))
+        else:
+            events.put(("done", moontea_folder))
+
+    def poll_events(create_desktop, create_start_menu):
+        progress = None
+        while True:
+            try:
+                kind, data = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = data
+            elif kind == "done":
+                progress_var.set(100)
+                # Ярлыки создаются через COM, поэтому в главном потоке
+                create_shortcuts(data, create_desktop, create_start_menu)
+                messagebox.showinfo("Установка завершена", "Установка завершена")
+                root.quit()
+                return
+            elif kind == "error":
+                install_button.config(state=tk.NORMAL)
+                messagebox.showerror("Ошибка установки", f"Не удалось установить MoonTea: {data}\nЖурнал: {LOG_PATH}")
+                return
+        if progress is not None:
+            current, total = progress
+            if total:
+                progress_var.set(min(current / total * 100, 100))
+        root.after(100, poll_events, create_desktop, create_start_menu)
 
     def browse_folder():
         folder_selected = filedialog.askdirectory()
@@ -60,7 +221,8 @@ def main():
             folder_var.set(folder_selected)
 
     def update_progress(current, total):
-        progress_var.set(current / total * 100)
+        # Вызывается из потоков загрузки, поэтому только кладёт событие в очередь
+        events.put(("progress", (current, total)))
 
     root = tk.Tk()
     root.title("Установщик MoonTea")
@@ -81,7 +243,8 @@ def main():
 
     ttk.Progressbar(root, variable=progress_var, maximum=100).pack(fill='x', padx=10, pady=10)
 
-    ttk.Button(root, text="Установить", command=on_install).pack(pady=10)
+    install_button = ttk.Button(root, text="Установить", command=on_install)
+    install_button.pack(pady=10)
 
     root.mainloop()
 
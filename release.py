@@ -0,0 +1,103 @@
+import argparse  # Разбор параметров командной строки.
+import base64  # Ключ и подпись передаются в base64.
+import hashlib  # Хэши exe и его блоков.
+import json  # Описание обновления для /api/launcher/version.
+import os  # Работа с файловой системой.
+import sys  # Код возврата при ошибке.
+
+import app  # Версия лаунчера и встроенный открытый ключ.
+
+# Подготовка обновления лаунчера на стороне релиза:
+#   python release.py keygen                 — один раз создать пару ключей Ed25519
+#   python release.py sign dist/MoonTea.exe  — описание обновления для /api/launcher/version
+# Закрытый ключ хранится только у того, кто выпускает релизы, и не попадает в репозиторий
+
+DEFAULT_PRIVATE_KEY = "release_key.pem"
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def public_key_base64(private_key):
+    from cryptography.hazmat.primitives import serialization
+
+    raw = private_key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return base64.b64encode(raw).decode("ascii")
+
+
+def load_private_key(path):
+    from cryptography.hazmat.primitives import serialization
+
+    with open(path, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+
+def keygen(args):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    if os.path.exists(args.private_key):
+        sys.exit(f"{args.private_key} уже существует: новый ключ сделает невозможным обновление установленных лаунчеров")
+    private_key = Ed25519PrivateKey.generate()
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    with open(os.open(args.private_key, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+        f.write(pem)
+    print(f"Закрытый ключ сохранён в {args.private_key}")
+    print(f'UPDATE_PUBLIC_KEY = "{public_key_base64(private_key)}"')
+
+
+def describe_exe(path, block_size):
+    # Те же поля, что читают check_for_update и plan_delta
+    digest = hashlib.sha256()
+    blocks = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block_size), b""):
+            digest.update(chunk)
+            blocks.append(hashlib.sha256(chunk).hexdigest())
+    return {
+        "size": os.path.getsize(path),
+        "hash": digest.hexdigest(),
+        "block_size": block_size,
+        "blocks": blocks,
+    }
+
+
+def sign(args):
+    private_key = load_private_key(args.private_key)
+    if public_key_base64(private_key) != app.UPDATE_PUBLIC_KEY:
+        sys.exit("Ключ не соответствует UPDATE_PUBLIC_KEY в app.py: лаунчеры отклонят такое обновление")
+
+    info = {"version": args.version, **describe_exe(args.exe, args.block_size)}
+    signature = private_key.sign(f"{info['version']}\n{info['hash']}".encode("utf-8"))
+    info["signature"] = base64.b64encode(signature).decode("ascii")
+    if not app.verify_update_signature(info):
+        sys.exit("Проверка подписи не прошла")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=4)
+    print(f"Версия {info['version']}: {info['size']} байт, блоков {len(info['blocks'])}, описание в {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подпись обновлений MoonTea Launcher")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    keygen_parser = commands.add_parser("keygen", help="создать пару ключей Ed25519")
+    keygen_parser.add_argument("--private-key", default=DEFAULT_PRIVATE_KEY, help="куда сохранить закрытый ключ")
+    keygen_parser.set_defaults(handler=keygen)
+
+    sign_parser = commands.add_parser("sign", help="описать и подписать собранный exe")
+    sign_parser.add_argument("exe", help="путь к собранному MoonTea.exe")
+    # Версия по умолчанию берётся из app.py, из которого собран exe: иначе лаунчер будет обновляться бесконечно
+    sign_parser.add_argument("--version", default=app.LAUNCHER_VERSION, help="версия, которую сообщает exe")
+    sign_parser.add_argument("--private-key", default=DEFAULT_PRIVATE_KEY, help="закрытый ключ релиза")
+    sign_parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="размер блока для дельты")
+    sign_parser.add_argument("--output", default="launcher_version.json", help="ответ для /api/launcher/version")
+    sign_parser.set_defaults(handler=sign)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()